@@ -0,0 +1,63 @@
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from html_sanitizer import StreamSanitizer, sanitize, split_html
+
+# ⏱️ Сравнение однопроходного санитайзера со старым путём BeautifulSoup + replace().
+# BeautifulSoup нужен только здесь: pip install beautifulsoup4
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+ALLOWED_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "code", "pre", "a"}
+
+SAMPLE = (
+    "<h2>🤖 ИИ-агенты в деле</h2><p>Сегодня <b>автоматизация</b> — это не только <i>скрипты</i>, "
+    "но и <a href=\"https://example.com/?a=1&b=2\">агенты</a> & пайплайны.</p>"
+    "<ul><li>Парсинг лент</li><li>Генерация <b>постов</b></li><li>Ответы 24/7</li></ul>"
+    "<p>Итог: 1 < 2, а <code>asyncio</code> — наше всё!</p>"
+)
+
+
+def bs4_path(html: str) -> str:
+    html = html.replace("<ul>", "").replace("</ul>", "").replace("<li>", "• ").replace("</li>", "")
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all(True):
+        if tag.name not in ALLOWED_TAGS:
+            tag.unwrap()
+    return str(soup)
+
+
+def stream_path(html: str, step: int = 16) -> str:
+    # Как при стриминге: куски по step символов и снимок после каждого
+    sanitizer = StreamSanitizer()
+    for i in range(0, len(html), step):
+        sanitizer.feed(html[i:i + step]).snapshot()
+    return sanitizer.finish()
+
+
+def bench(name: str, fn, html: str, number: int):
+    seconds = min(timeit.repeat(lambda: fn(html), number=number, repeat=5))
+    print(f"{name:<28} {len(html):>7} симв.  {seconds / number * 1e6:>10.1f} мкс/вызов")
+
+
+def main():
+    for copies in (1, 10, 100):
+        html = SAMPLE * copies
+        number = max(2000 // copies, 10)
+        print(f"--- {copies} x образец ---")
+        if BeautifulSoup is not None:
+            bench("BeautifulSoup + replace", bs4_path, html, number)
+        bench("sanitize", sanitize, html, number)
+        bench("StreamSanitizer (16 симв.)", stream_path, html, number)
+        bench("sanitize + split_html", lambda h: split_html(sanitize(h)), html, number)
+    if BeautifulSoup is None:
+        print("beautifulsoup4 не установлен — сравнение со старым путём пропущено")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import json
+import time
+import random
+import asyncio
+import itertools
+from email.utils import formatdate
+
+from aiohttp import web
+
+# 🧪 Локальные заглушки Telegram Bot API, OpenRouter и RSS для нагрузочных тестов
+
+
+async def start_app(app: web.Application, port: int = 0) -> tuple:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+# 🤖 Telegram Bot API: отвечает на любые методы, считает вызовы, умеет задерживаться и отдавать 429
+class FakeTelegram:
+    def __init__(self, latency: float = 0.02, flood_rate: float = 0.0, retry_after: int = 1,
+                 username: str = "BenchBot"):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.username = username
+        self.calls = {}
+        self.listeners = []  # (method, data) -> None
+        self._message_ids = itertools.count(1)
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    async def handle(self, request):
+        method = request.match_info["method"]
+        data = dict(await request.post())
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method in ("sendMessage", "editMessageText") and random.random() < self.flood_rate:
+            return web.json_response({
+                "ok": False, "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+        for listener in self.listeners:
+            listener(method, data)
+        return web.json_response({"ok": True, "result": self._result(method, data)})
+
+    def _result(self, method: str, data: dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": self.username}
+        if method in ("sendMessage", "editMessageText"):
+            chat_id = int(data.get("chat_id", 0))
+            return {
+                "message_id": int(data.get("message_id") or next(self._message_ids)),
+                "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+                "text": data.get("text", ""),
+            }
+        return True
+
+
+# 🧠 OpenRouter /chat/completions: задержка, стриминг по словам, доля 500 и 429
+class FakeOpenRouter:
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, token_delay: float = 0.01,
+                 error_rate: float = 0.0, rate_limit_rate: float = 0.0, words: int = 120):
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.words = words
+        self.requests = 0
+        self.app = web.Application()
+        self.app.router.add_post("/chat/completions", self.handle)
+
+    def _text(self) -> str:
+        body = " ".join(f"слово{i}" for i in range(self.words))
+        return f"<b>Ответ</b> 🤖\n<ul><li>{body}</li><li>итог</li></ul>"
+
+    async def handle(self, request):
+        self.requests += 1
+        payload = await request.json()
+        await asyncio.sleep(max(self.latency + random.uniform(-self.jitter, self.jitter), 0))
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return web.json_response({"error": {"message": "rate limited"}}, status=429, headers={"Retry-After": "1"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return web.json_response({"error": {"message": "upstream error"}}, status=500)
+        text = self._text()
+        if not payload.get("stream"):
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": text}}]})
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        for word in text.split(" "):
+            chunk = {"choices": [{"delta": {"content": word + " "}}]}
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+# 📡 RSS-лента с ETag: на повторный запрос с If-None-Match отвечает 304
+class FakeRss:
+    def __init__(self, items: int = 30, latency: float = 0.05):
+        self.items = items
+        self.latency = latency
+        self.requests = 0
+        self.etag = '"bench-1"'
+        self.app = web.Application()
+        self.app.router.add_get("/rss", self.handle)
+
+    def _body(self) -> str:
+        items = "".join(
+            f"<item><title>Новость про ИИ номер {i}</title><guid>bench-{i}</guid>"
+            f"<pubDate>{formatdate(time.time() - i * 60)}</pubDate></item>"
+            for i in range(self.items)
+        )
+        return f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>Bench</title>{items}</channel></rss>'
+
+    async def handle(self, request):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        if request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304)
+        return web.Response(text=self._body(), content_type="application/rss+xml", headers={"ETag": self.etag})
@@ -0,0 +1,193 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_servers import FakeOpenRouter, FakeRss, FakeTelegram, start_app
+
+# 🏋️ Нагрузочный тест: N пользователей в личке и всплески в группе против dp/reply_handler,
+# Telegram, OpenRouter и RSS — локальные заглушки. Пример:
+#   python benchmarks/load_test.py --users 50 --messages 5 --bursts 3 --burst-size 40
+GROUP_CHAT_ID = -100500
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на локальных заглушках")
+    parser.add_argument("--users", type=int, default=20, help="пользователей в личке")
+    parser.add_argument("--messages", type=int, default=3, help="сообщений на пользователя")
+    parser.add_argument("--think", type=float, default=0.5, help="пауза пользователя между сообщениями, сек")
+    parser.add_argument("--bursts", type=int, default=2, help="всплесков в группе")
+    parser.add_argument("--burst-size", type=int, default=30, help="сообщений во всплеске")
+    parser.add_argument("--mention-rate", type=float, default=0.2, help="доля групповых сообщений с упоминанием")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-429-rate", type=float, default=0.0)
+    parser.add_argument("--tg-latency", type=float, default=0.02)
+    parser.add_argument("--tg-flood-rate", type=float, default=0.0, help="доля ответов 429 от Telegram")
+    parser.add_argument("--stream", action="store_true", help="стриминг ответов в личке")
+    parser.add_argument("--tracemalloc", action="store_true", help="пик памяти Python-объектов (медленнее)")
+    return parser.parse_args()
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def update(update_id: int, chat_id: int, user_id: int, text: str) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": text,
+        },
+    }
+
+
+async def run(args):
+    telegram = FakeTelegram(latency=args.tg_latency, flood_rate=args.tg_flood_rate)
+    openrouter = FakeOpenRouter(latency=args.llm_latency, error_rate=args.llm_error_rate,
+                                rate_limit_rate=args.llm_429_rate)
+    rss = FakeRss()
+    runners = []
+    for server in (telegram, openrouter, rss):
+        runner, url = await start_app(server.app)
+        runners.append(runner)
+        server.url = url
+
+    # Конфигурация читается при импорте модулей — окружение выставляем до import main
+    workdir = tempfile.mkdtemp(prefix="ailex-bench-")
+    os.environ.update({
+        "BOT_TOKEN": "123456:BENCHbenchBENCHbenchBENCHbench",
+        "OPENROUTER_API_KEY": "bench",
+        "TELEGRAM_API_URL": telegram.url,
+        "OPENROUTER_BASE_URL": openrouter.url,
+        "RSS_FEEDS": f"bench={rss.url}/rss",
+        "RSS_CACHE_DIR": os.path.join(workdir, "cache"),
+        "SESSIONS_DB": os.path.join(workdir, "sessions.sqlite3"),
+        "STREAM_PRIVATE": "1" if args.stream else "0",
+        "BOT_MODE": "polling",
+    })
+    if args.tracemalloc:
+        tracemalloc.start()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    import main
+    from aiogram import Bot, types
+
+    logging.getLogger().setLevel(logging.WARNING)
+    Bot.set_current(main.bot)
+    await main.mention_gate.load_identity(main.bot)
+    main.scheduler.start()
+    main.outbound.start()
+
+    # ⏱️ Задержка: от апдейта до завершения ответа (включая окно склейки и очередь планировщика)
+    latencies = []
+    waiting = {}  # user_id -> (время апдейта, future)
+    original = main.schedule_answer
+
+    async def timed_schedule_answer(msg, user_id, text):
+        try:
+            await original(msg, user_id, text)
+        finally:
+            entry = waiting.pop(user_id, None)
+            if entry is not None:
+                latencies.append(time.perf_counter() - entry[0])
+                entry[1].set_result(None)
+
+    main.schedule_answer = timed_schedule_answer
+
+    # В стриминге ответ приходит правками плейсхолдера, поэтому считаем только отказы
+    replies = {"failed": 0, "busy": 0}
+
+    def on_call(method, data):
+        if method != "sendMessage":
+            return
+        text = data.get("text", "")
+        if text.startswith("⚠️"):
+            replies["failed"] += 1
+        elif text.startswith("🚦"):
+            replies["busy"] += 1
+
+    telegram.listeners.append(on_call)
+    update_ids = iter(range(1, 10 ** 9))
+
+    async def send(chat_id, user_id, text, expect_answer=True):
+        future = asyncio.get_running_loop().create_future()
+        if expect_answer:
+            waiting[user_id] = (time.perf_counter(), future)
+        await main.dp.process_update(types.Update(**update(next(update_ids), chat_id, user_id, text)))
+        if expect_answer:
+            await future
+
+    async def private_user(user_id):
+        for i in range(args.messages):
+            await send(user_id, user_id, f"Вопрос {i} от {user_id}: как автоматизировать рутину?")
+            await asyncio.sleep(random.uniform(0, args.think * 2))
+
+    async def group_burst(burst):
+        tasks = []
+        for i in range(args.burst_size):
+            user_id = 1_000_000 + burst * args.burst_size + i
+            if random.random() < args.mention_rate:
+                text = f"@{telegram.username} вопрос {i} во всплеске {burst}"
+                tasks.append(asyncio.create_task(send(GROUP_CHAT_ID, user_id, text)))
+            else:
+                await send(GROUP_CHAT_ID, user_id, f"просто болтаем {i}", expect_answer=False)
+        await asyncio.gather(*tasks)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(private_user(user_id) for user_id in range(1, args.users + 1)),
+        *(group_burst(burst) for burst in range(args.bursts)),
+    )
+    elapsed = time.perf_counter() - started
+
+    # 📡 Сбор лент: первый запрос и повторный (304 по ETag)
+    feed_times = []
+    for _ in range(2):
+        t0 = time.perf_counter()
+        await main.feed_aggregator.collect()
+        feed_times.append(time.perf_counter() - t0)
+
+    peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(f"\n🏋️ Пользователей: {args.users} × {args.messages}, всплесков: {args.bursts} × {args.burst_size} "
+          f"(упоминаний ~{args.mention_rate:.0%}), стриминг: {'да' if args.stream else 'нет'}")
+    print(f"⏱️ Задержка ответа, сек: p50={percentile(latencies, 0.5):.3f} p95={percentile(latencies, 0.95):.3f} "
+          f"p99={percentile(latencies, 0.99):.3f} max={max(latencies, default=0):.3f} (n={len(latencies)})")
+    print(f"🚀 Пропускная способность: {len(latencies) / elapsed:.1f} ответов/сек за {elapsed:.1f} сек")
+    replies["ok"] = len(latencies) - replies["failed"] - replies["busy"]
+    print(f"📨 Ответы: {replies}, отсечено фильтром групп: {main.mention_gate.stats()['short_circuited']}")
+    print(f"📡 Сбор лент: первый {feed_times[0]:.3f} сек, повторный (кеш или 304) {feed_times[1]:.3f} сек, запросов к ленте: {rss.requests}")
+    print(f"🧠 Память: maxrss {rss_before // 1024} → {rss_after // 1024} МБ"
+          + (f", пик tracemalloc {peak / 2 ** 20:.1f} МБ" if peak is not None else ""))
+    print(f"🚦 Планировщик: {main.scheduler.stats()}")
+    print(f"📮 Исходящие: {main.outbound.stats()}")
+    print(f"🧭 Маршрутизатор: {main.router.stats()}")
+    print(f"🤖 Вызовы Telegram: {telegram.calls}, запросов к OpenRouter: {openrouter.requests}")
+
+    await main.scheduler.stop()
+    await main.outbound.stop()
+    await main.http_clients.aclose()
+    await (await main.bot.get_session()).close()
+    for runner in runners:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
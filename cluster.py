@@ -0,0 +1,137 @@
+import os
+import socket
+import asyncio
+import logging
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from state_backend import StateBackend, state_backend
+
+# 🧩 Шардирование: инстанс WORKER_INDEX из WORKER_COUNT обслуживает пользователей с
+# user_id % WORKER_COUNT == WORKER_INDEX. Telegram отдаёт апдейт только одному получателю,
+# поэтому нужен прокси, который зеркалирует вебхук на всех воркеров (у каждого свой PORT);
+# SHARD_MIRRORED=1 подтверждает, что он настроен. Лишние апдейты воркер отбрасывает сам
+WORKER_COUNT = int(os.getenv("WORKER_COUNT", "1"))
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+SHARD_MIRRORED = os.getenv("SHARD_MIRRORED", "0") == "1"
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+# 👑 Аренда лидера: держится LEADER_TTL секунд, продлевается каждые LEADER_RENEW
+LEADER_TTL = float(os.getenv("LEADER_TTL", "30"))
+LEADER_RENEW = float(os.getenv("LEADER_RENEW", "10"))
+
+
+def owns_user(user_id: int, index: int = WORKER_INDEX, count: int = WORKER_COUNT) -> bool:
+    return count <= 1 or user_id % count == index
+
+
+# 🧩 Без зеркалирования апдейтов шардирование молча теряет чужих пользователей — не стартуем.
+# Причина отказа или None, если конфигурация годится
+def sharding_problem(mode: str, count: int = WORKER_COUNT, mirrored: bool = SHARD_MIRRORED):
+    if count <= 1:
+        return None
+    if mode != "webhook":
+        return "WORKER_COUNT > 1 не работает в режиме polling: getUpdates отдаёт апдейт одному воркеру"
+    if not mirrored:
+        return ("WORKER_COUNT > 1 требует прокси, который отправляет каждый апдейт всем воркерам; "
+                "настройте его и укажите SHARD_MIRRORED=1")
+    return None
+
+
+# 🧩 Апдейты чужих пользователей отбрасываются до любой работы хендлеров
+class ShardGate(BaseMiddleware):
+    def __init__(self, index: int = WORKER_INDEX, count: int = WORKER_COUNT):
+        super().__init__()
+        self.index = index
+        self.count = count
+        self._stats = {"owned": 0, "foreign": 0}
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        if not owns_user(message.from_user.id, self.index, self.count):
+            self._stats["foreign"] += 1
+            raise CancelHandler()
+        self._stats["owned"] += 1
+
+    def stats(self) -> dict:
+        return {"shard": f"{self.index}/{self.count}", **self._stats}
+
+
+# 👑 Выборы лидера через аренду в общем хранилище: пока аренда наша, крутятся задачи
+# лидера (автопостинг, очистка сессий); потеряли аренду — задачи отменяются
+class LeaderElection:
+    def __init__(self, backend: StateBackend = state_backend, name: str = "leader", owner: str = WORKER_ID,
+                 ttl: float = LEADER_TTL, renew: float = LEADER_RENEW):
+        self.backend = backend
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.renew = renew
+        self.is_leader = False
+        self._jobs = []      # фабрики корутин: () -> coroutine
+        self._loaders = []   # синхронные функции: перечитать общее состояние перед задачами
+        self._running = []
+        self._task = None
+        self._stats = {"elected": 0, "lost": 0, "errors": 0}
+
+    def leader_only(self, factory):
+        self._jobs.append(factory)
+        return factory
+
+    # ♻️ Пока лидером был другой инстанс, общее состояние могло измениться
+    def on_elected(self, loader):
+        self._loaders.append(loader)
+        return loader
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._step_down()
+        try:
+            await asyncio.to_thread(self.backend.release, self.name, self.owner)
+        except Exception as e:
+            logging.warning(f"⚠️ Не удалось освободить аренду лидера: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                leader = await asyncio.to_thread(self.backend.acquire, self.name, self.owner, self.ttl)
+            except Exception as e:
+                # Хранилище недоступно — безопаснее перестать быть лидером, чем постить дважды
+                self._stats["errors"] += 1
+                logging.error(f"❌ Ошибка продления аренды лидера: {e}")
+                leader = False
+            if leader and not self.is_leader:
+                await self._step_up()
+            elif not leader and self.is_leader:
+                await self._step_down()
+            await asyncio.sleep(self.renew)
+
+    async def _step_up(self):
+        self.is_leader = True
+        self._stats["elected"] += 1
+        logging.info(f"👑 {self.owner} стал лидером, запускаем задачи: {len(self._jobs)}")
+        for loader in self._loaders:
+            await asyncio.to_thread(loader)
+        self._running = [asyncio.create_task(factory()) for factory in self._jobs]
+
+    async def _step_down(self):
+        if not self.is_leader:
+            return
+        self.is_leader = False
+        self._stats["lost"] += 1
+        logging.warning(f"👑 {self.owner} больше не лидер, останавливаем задачи")
+        for task in self._running:
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        self._running = []
+
+    def stats(self) -> dict:
+        return {"owner": self.owner, "leader": self.is_leader, **self._stats}
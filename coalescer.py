@@ -0,0 +1,71 @@
+import os
+import asyncio
+import logging
+
+# ⏳ Окно тишины: сообщения пользователя внутри окна склеиваются в одну реплику
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "1.5"))
+
+log = logging.getLogger("ailex.updates")
+
+
+# 🧩 Склейка серии быстрых сообщений в один запрос к LLM
+class MessageCoalescer:
+    def __init__(self, handler, window: float = COALESCE_WINDOW):
+        self.window = window
+        self._handler = handler  # async handler(user_id, text, msg)
+        # Состояние ведётся по (чат, пользователь): личка и упоминание в группе не смешиваются
+        self._buffers = {}   # (chat_id, user_id) -> [тексты, ещё не получившие ответа]
+        self._last_msg = {}  # (chat_id, user_id) -> последнее сообщение (на него отвечаем)
+        self._timers = {}
+        self._inflight = {}
+        self._stats = {"messages": 0, "batches": 0, "merged": 0, "cancelled": 0}
+
+    def add(self, user_id, text: str, msg):
+        self._stats["messages"] += 1
+        key = (msg.chat.id, user_id)
+        self._buffers.setdefault(key, []).append(text)
+        self._last_msg[key] = msg
+
+        # Пришло новое — текущая генерация устарела, её тексты уйдут в следующую пачку
+        task = self._inflight.pop(key, None)
+        if task is not None and task.cancel():
+            self._stats["cancelled"] += 1
+            log.info("✂️ Генерация для %s в чате %s отменена: пришло новое сообщение", user_id, msg.chat.id)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[key] = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+    def _flush(self, key):
+        chat_id, user_id = key
+        self._timers.pop(key, None)
+        texts = list(self._buffers.get(key, ()))
+        if not texts:
+            return
+        self._stats["batches"] += 1
+        if len(texts) > 1:
+            self._stats["merged"] += len(texts) - 1
+            log.info("🧩 Склеено %d сообщений пользователя %s в чате %s", len(texts), user_id, chat_id)
+
+        task = asyncio.create_task(self._handler(user_id, "\n".join(texts), self._last_msg[key]))
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t, len(texts)))
+
+    def _done(self, key, task, count):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logging.error(f"❌ Ошибка обработки сообщений {key[1]} в чате {key[0]}: {task.exception()}")
+
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            del buffer[:count]
+            if not buffer and key not in self._timers:
+                del self._buffers[key]
+                self._last_msg.pop(key, None)
+
+    def stats(self) -> dict:
+        return {**self._stats, "pending_users": len(self._buffers), "inflight": len(self._inflight)}
@@ -0,0 +1,106 @@
+import os
+import sys
+import asyncio
+import logging
+from collections import deque
+
+# 📐 Бюджет контекста в токенах (без системного промпта)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+# 🔢 Быстрая локальная оценка числа токенов без токенизатора.
+# Латиница ~4 символа на токен, кириллица и прочее не-ASCII ~2.5
+def estimate_tokens(text: str) -> int:
+    non_ascii = len(text.encode("utf-8")) - len(text)
+    return int((len(text) - non_ascii) / 4 + non_ascii / 2.5) + MESSAGE_OVERHEAD_TOKENS
+
+
+# 🧱 Компактная запись реплики: слоты вместо dict, роли интернированы
+class Turn:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str, tokens: int = None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.tokens = estimate_tokens(content) if tokens is None else tokens
+
+
+# 💬 История диалога: свежие реплики в пределах бюджета + свёрнутое резюме старых
+class Conversation:
+    def __init__(self, summarizer, budget: int = CONTEXT_TOKEN_BUDGET):
+        self.budget = budget
+        self.turns = deque()   # Turn
+        self.tokens = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.version = 0       # растёт при каждом изменении — по нему пишутся снапшоты
+        self._summarizer = summarizer  # async summarizer(summary, [(role, content)]) -> str
+        self._to_fold = []
+        self._folding = None
+
+    def append(self, message: dict):
+        turn = Turn(message["role"], message["content"])
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        self.version += 1
+        self._compact()
+
+    # 📤 Сообщения для запроса: резюме + свежие реплики, которые влезают в бюджет
+    def messages(self, reserve: int = 0) -> list:
+        budget = self.budget - reserve - self.summary_tokens
+        selected = []
+        for turn in reversed(self.turns):
+            if budget - turn.tokens < 0 and selected:
+                break
+            budget -= turn.tokens
+            selected.append({"role": turn.role, "content": turn.content})
+        selected.reverse()
+        if self.summary:
+            selected.insert(0, {"role": "system", "content": f"Кратко о предыдущем разговоре: {self.summary}"})
+        return selected
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def __len__(self):
+        return len(self.turns)
+
+    # 💾 Сериализация для снапшотов
+    def to_dict(self) -> dict:
+        return {"summary": self.summary, "turns": [[t.role, t.content] for t in self.turns]}
+
+    def load(self, data: dict):
+        self.summary = data.get("summary", "")
+        self.summary_tokens = estimate_tokens(self.summary) if self.summary else 0
+        self.turns = deque(Turn(role, content) for role, content in data.get("turns", []))
+        self.tokens = sum(t.tokens for t in self.turns)
+
+    # 🗜️ Выталкиваем старые реплики за бюджет и сворачиваем их в резюме фоном
+    def _compact(self):
+        limit = self.budget - self.summary_tokens
+        while self.tokens > limit and len(self.turns) > 2:
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            self._to_fold.append((turn.role, turn.content))
+        if self._to_fold and self._folding is None:
+            self._folding = asyncio.create_task(self._fold())
+
+    async def _fold(self):
+        try:
+            while self._to_fold:
+                batch, self._to_fold = self._to_fold, []
+                try:
+                    summary = await self._summarizer(self.summary, batch)
+                except Exception as e:
+                    logging.error(f"❌ Не удалось обновить резюме диалога: {e}")
+                    continue
+                if not summary:
+                    continue
+                self.summary = summary
+                self.summary_tokens = estimate_tokens(summary)
+                self.version += 1
+                logging.info(f"🗜️ Свёрнуто реплик: {len(batch)}, резюме ~{self.summary_tokens} токенов")
+        finally:
+            self._folding = None
@@ -0,0 +1,42 @@
+import re
+import logging
+
+from aiogram import Bot, types
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+GROUP_CHAT_TYPES = {"group", "supergroup"}
+
+
+# 🚪 Фильтр на уровне диспетчера: групповые сообщения без упоминания бота
+# отбрасываются до фильтров и хендлеров — без сессий, логов и запросов к API
+class MentionGate(BaseMiddleware):
+    def __init__(self):
+        super().__init__()
+        self.username = None
+        self._mention = None
+        self._stats = {"passed": 0, "short_circuited": 0}
+
+    # 🤖 Профиль бота запрашиваем один раз при старте
+    async def load_identity(self, bot: Bot):
+        me = await bot.get_me()
+        self.username = me.username
+        self._mention = re.compile(rf"@{re.escape(me.username)}\b", re.IGNORECASE)
+        logging.info(f"🤖 Бот: @{me.username} (id {me.id})")
+
+    def mentioned(self, text: str) -> bool:
+        return bool(text) and self._mention is not None and self._mention.search(text) is not None
+
+    def strip_mention(self, text: str) -> str:
+        if self._mention is None:
+            return text.strip()
+        return self._mention.sub("", text).strip()
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        if message.chat.type in GROUP_CHAT_TYPES and not self.mentioned(message.text):
+            self._stats["short_circuited"] += 1
+            raise CancelHandler()
+        self._stats["passed"] += 1
+
+    def stats(self) -> dict:
+        return dict(self._stats)
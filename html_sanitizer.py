@@ -0,0 +1,224 @@
+import re
+import html
+
+from metrics import timed
+
+# 🧼 Однопроходная очистка HTML под Telegram (parse_mode=HTML) без построения дерева
+TELEGRAM_MAX_LEN = 4096
+ALLOWED_TAGS = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "code", "pre", "a"}
+# Заголовки Telegram не знает — показываем их жирным
+TAG_ALIASES = {"h1": "b", "h2": "b", "h3": "b", "h4": "b", "h5": "b", "h6": "b"}
+
+_TAG = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9-]*)([^<>]*)>")
+_ENTITY = re.compile(r"&(?:[a-zA-Z][a-zA-Z0-9]{1,31}|#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6});")
+# Голый & или сущность; Telegram понимает только эти именованные и любые числовые
+_AMP = re.compile(r"&(?:([a-zA-Z][a-zA-Z0-9]{1,31}|#[0-9]{1,7}|#[xX][0-9a-fA-F]{1,6});)?")
+TELEGRAM_ENTITIES = {"lt", "gt", "amp", "quot"}
+_HREF = re.compile(r"""href\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+_PARTIAL_ENTITY = re.compile(r"&[a-zA-Z0-9#]{0,32}$")
+# Незакрытый тег придерживаем, пока он не длиннее сообщения: ссылка с длинным URL
+# в потоке остаётся ссылкой, как и при разовой очистке. Длиннее — это уже не разметка
+MAX_PENDING_TAG = TELEGRAM_MAX_LEN
+_TAG_START = re.compile(r"</?(?:[a-zA-Z][^<>]*)?$")
+MIN_SPLIT_ROOM = 64
+
+
+# Прочие именованные сущности (&nbsp;, &mdash;) раскрываем в символы, неизвестные — экранируем
+def _entity(m) -> str:
+    name = m.group(1)
+    if name is None:
+        return "&amp;"
+    if name in TELEGRAM_ENTITIES or name.startswith("#"):
+        return m.group(0)
+    decoded = html.unescape(m.group(0))
+    if decoded == m.group(0):
+        return "&amp;" + decoded[1:]
+    return decoded.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _escape_text(text: str) -> str:
+    if "&" in text:
+        text = _AMP.sub(_entity, text)
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+# 🌊 Потоковый санитайзер: принимает куски текста, незаконченный хвост тега/сущности
+# придерживает до следующего куска, в любой момент отдаёт валидный сбалансированный HTML
+class StreamSanitizer:
+    def __init__(self):
+        self._out = []
+        self._stack = []   # (имя тега, выведен ли он) — <a> без href выбрасываем вместе с закрытием
+        self._pending = ""
+
+    def feed(self, chunk: str) -> "StreamSanitizer":
+        data = self._pending + chunk
+        cut = self._safe_cut(data)
+        self._pending = data[cut:]
+        self._process(data[:cut])
+        return self
+
+    def finish(self) -> str:
+        self._process(self._pending)
+        self._pending = ""
+        while self._stack:
+            self._close_top()
+        return "".join(self._out)
+
+    # 🖼️ Текущее состояние с закрытыми тегами; внутреннее состояние не меняется
+    def snapshot(self) -> str:
+        closing = "".join(f"</{name}>" for name, emitted in reversed(self._stack) if emitted)
+        return "".join(self._out) + closing
+
+    def _safe_cut(self, data: str) -> int:
+        lt = data.rfind("<")
+        if lt != -1 and len(data) - lt < MAX_PENDING_TAG and _TAG_START.match(data, lt):
+            return lt
+        m = _PARTIAL_ENTITY.search(data)
+        return m.start() if m else len(data)
+
+    def _process(self, data: str):
+        pos = 0
+        for m in _TAG.finditer(data):
+            if m.start() > pos:
+                self._out.append(_escape_text(data[pos:m.start()]))
+            self._tag(m.group(1) == "/", m.group(2).lower(), m.group(3))
+            pos = m.end()
+        if pos < len(data):
+            self._out.append(_escape_text(data[pos:]))
+
+    def _tag(self, closing: bool, name: str, attrs: str):
+        name = TAG_ALIASES.get(name, name)
+        if name == "li":
+            if not closing:
+                self._out.append("• ")
+            return
+        if name == "br" or (name == "p" and closing):
+            self._out.append("\n")
+            return
+        if name not in ALLOWED_TAGS:
+            return
+        if closing:
+            if any(open_name == name for open_name, _ in self._stack):
+                while self._stack[-1][0] != name:
+                    self._close_top()
+                self._close_top()
+            return
+        if name == "a":
+            m = _HREF.search(attrs)
+            href = next((g for g in m.groups() if g is not None), "") if m else ""
+            if not href:
+                self._stack.append(("a", False))
+                return
+            self._out.append(f'<a href="{_escape_text(href).replace(chr(34), "&quot;")}">')
+        else:
+            self._out.append(f"<{name}>")
+        self._stack.append((name, True))
+
+    def _close_top(self):
+        name, emitted = self._stack.pop()
+        if emitted:
+            self._out.append(f"</{name}>")
+
+
+def sanitize(html: str) -> str:
+    with timed("html_clean"):
+        return StreamSanitizer().feed(html).finish()
+
+
+# ✂️ Разбиение очищенного HTML на сообщения не длиннее limit: открытые теги
+# закрываются в конце куска и открываются заново в следующем. Место под закрытие
+# и повторное открытие резервируется заранее; если вложенность не оставляет места
+# тексту, внутренние теги в следующем куске не открываются (текст сохраняется)
+def split_html(html: str, limit: int = TELEGRAM_MAX_LEN) -> list:
+    if len(html) <= limit:
+        return [html]
+
+    chunks = []
+    parts, size, content = [], 0, False
+    stack = []  # [имя, открывающий тег, открыт ли в текущем куске]
+    # Сколько может занять разметка, чтобы в куске осталось место под текст
+    markup_budget = limit - max(1, min(MIN_SPLIT_ROOM, limit // 2))
+
+    def closing_len():
+        return sum(len(name) + 3 for name, _, is_open in stack if is_open)
+
+    def flush():
+        nonlocal parts, size, content
+        closing = "".join(f"</{name}>" for name, _, is_open in reversed(stack) if is_open)
+        if content:
+            chunks.append("".join(parts) + closing)
+        parts, size, content = [], 0, False
+        closing_size = 0
+        for entry in stack:
+            name, tag, _ = entry
+            entry[2] = size + len(tag) + closing_size + len(name) + 3 <= markup_budget
+            if entry[2]:
+                parts.append(tag)
+                size += len(tag)
+                closing_size += len(name) + 3
+
+    pos = 0
+    tokens = []
+    for m in _TAG.finditer(html):
+        if m.start() > pos:
+            tokens.append((None, html[pos:m.start()]))
+        tokens.append((m, m.group(0)))
+        pos = m.end()
+    if pos < len(html):
+        tokens.append((None, html[pos:]))
+
+    for m, token in tokens:
+        if m is not None:
+            if m.group(1):
+                # Вход очищен и сбалансирован: закрывается верхний тег стека
+                if stack and stack.pop()[2]:
+                    parts.append(token)
+                    size += len(token)
+                continue
+            # Открывающему тегу нужно место и под себя, и под своё закрытие
+            need = len(token) + len(m.group(2)) + 3
+            if size + need + closing_len() > markup_budget and content:
+                flush()
+            is_open = size + need + closing_len() <= markup_budget
+            if is_open:
+                parts.append(token)
+                size += len(token)
+            stack.append([m.group(2), token, is_open])
+            continue
+
+        text = token
+        while text:
+            room = limit - size - closing_len()
+            if len(text) <= room:
+                parts.append(text)
+                size += len(text)
+                content = content or bool(text.strip())
+                break
+            if room < MIN_SPLIT_ROOM and content:
+                flush()
+                continue
+            cut = _split_point(text, room)
+            parts.append(text[:cut])
+            size += cut
+            content = content or bool(text[:cut].strip())
+            text = text[cut:].lstrip("\n ")
+            flush()
+    flush()
+    return chunks
+
+
+def _split_point(text: str, room: int) -> int:
+    window = text[:room]
+    for sep in ("\n\n", "\n", " "):
+        idx = window.rfind(sep)
+        if idx > room // 2:
+            return idx + len(sep)
+    # Не режем посреди сущности вроде &amp;
+    amp = window.rfind("&")
+    if amp > 0 and ";" not in window[amp:] and _ENTITY.match(text, amp):
+        return amp
+    return room
@@ -0,0 +1,105 @@
+import os
+import logging
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+
+# ⏱️ Таймауты и лимиты пулов (секунды / штуки)
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "120"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+
+
+# 🌐 Долгоживущие HTTP-клиенты: отдельный пул соединений на каждый хост
+class HttpClients:
+    def __init__(self, http2: bool = HTTP2_ENABLED):
+        self.http2 = http2
+        self._clients = {}
+        self._stats = defaultdict(lambda: {"requests": 0, "connects": 0, "errors": 0})
+
+    def _host_key(self, url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _make_client(self, host: str) -> httpx.AsyncClient:
+        stats = self._stats[host]
+
+        # Каждое новое TCP-соединение видно через trace-расширение httpcore
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.complete":
+                stats["connects"] += 1
+
+        async def on_request(request):
+            stats["requests"] += 1
+            request.extensions["trace"] = _async_trace(trace)
+
+        client = httpx.AsyncClient(
+            http2=self.http2,
+            timeout=httpx.Timeout(
+                connect=HTTP_CONNECT_TIMEOUT,
+                read=HTTP_READ_TIMEOUT,
+                write=HTTP_WRITE_TIMEOUT,
+                pool=HTTP_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+            event_hooks={"request": [on_request]},
+        )
+        logging.info(f"🌐 Создан пул соединений для {host} (http2={self.http2})")
+        return client
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        host = self._host_key(url)
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._make_client(host)
+            self._clients[host] = client
+        return client
+
+    def record_error(self, url: str):
+        self._stats[self._host_key(url)]["errors"] += 1
+
+    def stats(self) -> dict:
+        result = {}
+        for host, stats in self._stats.items():
+            client = self._clients.get(host)
+            connections = _pool_connections(client)
+            result[host] = {
+                **stats,
+                "reused": max(stats["requests"] - stats["connects"], 0),
+                "open": len(connections),
+                "idle": sum(1 for c in connections if c.is_idle()),
+            }
+        return result
+
+    async def aclose(self):
+        for host, client in list(self._clients.items()):
+            await client.aclose()
+            logging.info(f"🔌 Пул соединений для {host} закрыт")
+        self._clients.clear()
+
+
+def _async_trace(callback):
+    async def trace(event_name, info):
+        callback(event_name, info)
+    return trace
+
+
+def _pool_connections(client) -> list:
+    # У httpx нет публичного API пула — берём соединения httpcore, если они доступны
+    if client is None or client.is_closed:
+        return []
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    return list(getattr(pool, "connections", []))
+
+
+http_clients = HttpClients()
@@ -0,0 +1,154 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+
+# 🗃️ Кеш ответов LLM: размер, время жизни, необязательный дисковый уровень
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "")  # пусто — только память
+
+_SPACES = re.compile(r"\s+")
+
+
+def _digest(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+
+# 🔑 Ключи кеша: точный и нормализованный (пробелы схлопнуты, регистр не важен)
+def cache_keys(model: str, messages: list) -> tuple:
+    exact = _digest([model, [[m["role"], m["content"]] for m in messages]])
+    normalized = _digest([model, [[m["role"], _SPACES.sub(" ", m["content"]).strip().casefold()] for m in messages]])
+    return exact, normalized
+
+
+# 🗃️ LRU + TTL в памяти, SQLite на диске, single-flight для одинаковых запросов
+class ResponseCache:
+    def __init__(self, size: int = LLM_CACHE_SIZE, ttl: int = LLM_CACHE_TTL, path: str = LLM_CACHE_DB):
+        self.size = size
+        self.ttl = ttl
+        self.path = path
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}
+        self._stats = {"hits": 0, "normalized_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0}
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _put_memory(self, key, value):
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    async def get(self, keys: tuple):
+        exact, normalized = keys
+        value = self._get_memory(exact)
+        if value is not None:
+            self._stats["hits"] += 1
+            return value
+        value = self._get_memory(normalized)
+        if value is not None:
+            self._stats["normalized_hits"] += 1
+            return value
+        if self.path:
+            value = await asyncio.to_thread(self._read_disk, normalized)
+            if value is not None:
+                self._stats["disk_hits"] += 1
+                self._put_memory(exact, value)
+                self._put_memory(normalized, value)
+                return value
+        return None
+
+    async def put(self, keys: tuple, value: str):
+        for key in keys:
+            self._put_memory(key, value)
+        if self.path:
+            await asyncio.to_thread(self._write_disk, keys[1], value)
+
+    # 🔁 Ответ из кеша либо один общий вызов compute() на все одинаковые запросы
+    async def get_or_compute(self, keys: tuple, compute, cacheable=lambda value: True):
+        normalized = keys[1]
+        while True:
+            value = await self.get(keys)
+            if value is not None:
+                return value
+            future = self._inflight.get(normalized)
+            if future is None:
+                break
+            self._stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Отменили ведущий запрос, а не нас — пробуем сами
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        self._stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[normalized] = future
+        try:
+            value = await compute()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # ожидающих может не быть — не шумим в логах
+            raise
+        finally:
+            self._inflight.pop(normalized, None)
+        future.set_result(value)
+        if cacheable(value):
+            await self.put(keys, value)
+        return value
+
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+        return db
+
+    def _read_disk(self, key):
+        try:
+            db = self._connect()
+            try:
+                row = db.execute("SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Дисковый кеш LLM недоступен: {e}")
+            return None
+        if row is None or row[0] < time.time():
+            return None
+        return row[1]
+
+    def _write_disk(self, key, value):
+        try:
+            db = self._connect()
+            try:
+                with db:
+                    db.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, time.time() + self.ttl, value))
+                    db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logging.warning(f"⚠️ Не удалось записать в дисковый кеш LLM: {e}")
+
+    def stats(self) -> dict:
+        return {**self._stats, "entries": len(self._entries), "inflight": len(self._inflight)}
+
+
+llm_cache = ResponseCache()
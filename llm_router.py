@@ -0,0 +1,311 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+from http_client import http_clients
+from metrics import error
+
+# 🧭 Модели по приоритету: первая — основная, остальные — запасные
+LLM_MODELS = [m.strip() for m in os.getenv(
+    "LLM_MODELS", "meta-llama/llama-4-maverick,meta-llama/llama-4-scout,deepseek/deepseek-chat-v3-0324"
+).split(",") if m.strip()]
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1.0"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "2.0"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "8.0"))
+BREAKER_THRESHOLD = int(os.getenv("BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+
+class LLMError(Exception):
+    pass
+
+
+class LLMUpstreamError(LLMError):
+    def __init__(self, model: str, message: str, status: int = None):
+        super().__init__(f"{model}: {message}")
+        self.model = model
+        self.status = status
+
+
+class LLMRateLimited(LLMUpstreamError):
+    def __init__(self, model: str, retry_after: float = None):
+        super().__init__(model, "429 Too Many Requests", 429)
+        self.retry_after = retry_after
+
+
+class LLMTimeout(LLMUpstreamError):
+    pass
+
+
+class LLMUnavailable(LLMError):
+    pass
+
+
+def parse_retry_after(value) -> float:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+# 🔌 Предохранитель модели: после серии ошибок модель пропускается на время cooldown,
+# затем пропускаем один пробный запрос (half-open)
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "half-open":
+            # Пробный запрос: до его исхода (или следующего cooldown) остальные запросы модель обходят
+            self.opened_at = time.monotonic()
+            return True
+        return state == "closed"
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
+# 🧭 Маршрутизатор: запасные модели, хеджирование по p95, ретраи с джиттером
+class ModelRouter:
+    def __init__(self, base_url: str, models: list = LLM_MODELS):
+        self.base_url = base_url
+        self.models = models
+        self.breakers = {m: CircuitBreaker() for m in models}
+        self._latencies = {m: deque(maxlen=200) for m in models}
+        self._stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "fallbacks": 0, "retries": 0, "failures": 0}
+
+    def hedge_delay(self, model: str) -> float:
+        latencies = sorted(self._latencies[model])
+        if len(latencies) < 20:
+            return HEDGE_DEFAULT_DELAY
+        return max(latencies[int(len(latencies) * 0.95) - 1], HEDGE_MIN_DELAY)
+
+    # Только чтение состояния: пробный запрос half-open забирает _call/_stream_call при запуске
+    def available_models(self) -> list:
+        return [m for m in self.models if self.breakers[m].state != "open"]
+
+    def _claim(self, model: str):
+        if not self.breakers[model].allow():
+            # Пробный запрос уже забрал другой запрос — модель пропускаем, не считая это сбоем
+            raise LLMUpstreamError(model, "предохранитель открыт")
+
+    # 📤 Один запрос к одной модели; ошибки — типизированные исключения
+    async def _call(self, model: str, headers: dict, payload: dict) -> str:
+        self._claim(model)
+        started = time.monotonic()
+        try:
+            client = http_clients.get(self.base_url)
+            r = await client.post(
+                f"{self.base_url}/chat/completions",
+                json={**payload, "model": model},
+                headers=headers,
+                timeout=LLM_REQUEST_TIMEOUT,
+            )
+            if r.status_code == 429:
+                raise LLMRateLimited(model, parse_retry_after(r.headers.get("Retry-After")))
+            data = r.json()
+            if r.status_code != 200 or "choices" not in data:
+                raise LLMUpstreamError(model, str(data)[:300], r.status_code)
+            content = data["choices"][0]["message"]["content"]
+            if not content or not content.strip():
+                # Пустой ответ — такой же сбой модели: пусть сработают запасная модель и повтор
+                raise LLMUpstreamError(model, "пустой ответ", r.status_code)
+        except asyncio.CancelledError:
+            raise
+        except LLMError:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            raise
+        except httpx.TimeoutException as e:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            # Таймаут — тоже замер: ответ занял бы не меньше этого
+            self._latencies[model].append(time.monotonic() - started)
+            raise LLMTimeout(model, f"таймаут: {e!r}") from e
+        except Exception as e:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            raise LLMUpstreamError(model, repr(e)) from e
+        self.breakers[model].success()
+        self._latencies[model].append(time.monotonic() - started)
+        return content
+
+    # 🪂 Основная модель; если она медлит дольше p95 — параллельно запускаем запасную,
+    # если падает — сразу переходим к следующей. Проигравший запрос отменяется
+    async def _hedged(self, models: list, headers: dict, payload: dict) -> str:
+        pending = {}
+        launched_at = {}
+        errors = []
+        next_idx = 0
+
+        def launch():
+            nonlocal next_idx
+            model = models[next_idx]
+            next_idx += 1
+            task = asyncio.create_task(self._call(model, headers, payload))
+            pending[task] = model
+            launched_at[task] = time.monotonic()
+
+        launch()
+        try:
+            while pending:
+                timeout = self.hedge_delay(models[next_idx - 1]) if next_idx < len(models) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._stats["hedged"] += 1
+                    logging.info(f"🪂 {models[next_idx - 1]} медлит, запускаем запасную {models[next_idx]}")
+                    launch()
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        if model != models[0]:
+                            self._stats["hedge_wins" if pending else "fallbacks"] += 1
+                        # Проигравшие отменяются не дождавшись: их время — нижняя оценка задержки,
+                        # без неё p95 занижен медленными ответами, которые мы не досчитали
+                        now = time.monotonic()
+                        for loser, loser_model in pending.items():
+                            self._latencies[loser_model].append(now - launched_at[loser])
+                        return task.result()
+                    errors.append(task.exception())
+                    logging.warning(f"⚠️ Модель {model} не ответила: {task.exception()}")
+                if not pending and next_idx < len(models):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise errors[-1]
+
+    # 🌊 Потоковый запрос (SSE) к одной модели
+    async def _stream_call(self, model: str, headers: dict, payload: dict):
+        self._claim(model)
+        try:
+            client = http_clients.get(self.base_url)
+            async with client.stream(
+                "POST", f"{self.base_url}/chat/completions",
+                json={**payload, "model": model, "stream": True}, headers=headers,
+            ) as r:
+                if r.status_code == 429:
+                    raise LLMRateLimited(model, parse_retry_after(r.headers.get("Retry-After")))
+                if r.status_code != 200:
+                    body = await r.aread()
+                    raise LLMUpstreamError(model, body[:300].decode("utf-8", "replace"), r.status_code)
+                async for line in r.aiter_lines():
+                    # Комментарии вида ": OPENROUTER PROCESSING" и пустые строки пропускаем
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: "):]
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if "error" in chunk:
+                        raise LLMUpstreamError(model, str(chunk["error"])[:300])
+                    delta = chunk["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
+        except (asyncio.CancelledError, GeneratorExit):
+            raise
+        except LLMError:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            raise
+        except httpx.TimeoutException as e:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            raise LLMTimeout(model, f"таймаут: {e!r}") from e
+        except Exception as e:
+            self.breakers[model].failure()
+            http_clients.record_error(self.base_url)
+            raise LLMUpstreamError(model, repr(e)) from e
+        self.breakers[model].success()
+
+    # 🌊 Стриминг с переходом на запасную модель, пока не пришёл первый токен.
+    # Хеджирования нет: два потока в одно сообщение не склеить
+    async def stream(self, headers: dict, payload: dict):
+        self._stats["requests"] += 1
+        last_error = None
+        for model in self.available_models():
+            started = False
+            try:
+                async for delta in self._stream_call(model, headers, payload):
+                    started = True
+                    yield delta
+                return
+            except LLMError as e:
+                if started:
+                    raise
+                last_error = e
+                self._stats["fallbacks"] += 1
+                logging.warning(f"⚠️ Модель {model} не начала стрим: {e}")
+        self._stats["failures"] += 1
+        error("llm")
+        raise LLMUnavailable(f"Все модели недоступны: {last_error}") from last_error
+
+    async def complete(self, headers: dict, payload: dict) -> str:
+        self._stats["requests"] += 1
+        last_error = None
+        for attempt in range(LLM_RETRIES + 1):
+            models = self.available_models()
+            if not models:
+                break
+            try:
+                return await self._hedged(models, headers, payload)
+            except LLMError as e:
+                last_error = e
+            if attempt == LLM_RETRIES:
+                break
+            # Retry-After от OpenRouter важнее нашего backoff; если ждать дольше LLM_BACKOFF_MAX,
+            # пользователю быстрее ответить ошибкой, чем повторять раньше срока и ловить новый 429
+            delay = getattr(last_error, "retry_after", None)
+            if delay is not None and delay > LLM_BACKOFF_MAX:
+                logging.warning(f"🔁 Retry-After {delay:.0f} сек больше {LLM_BACKOFF_MAX:.0f}, не повторяем")
+                break
+            self._stats["retries"] += 1
+            if delay is None:
+                delay = random.uniform(0, min(LLM_BACKOFF_BASE * 2 ** attempt, LLM_BACKOFF_MAX))
+            logging.info(f"🔁 Повтор запроса к LLM через {delay:.1f} сек")
+            await asyncio.sleep(delay)
+        self._stats["failures"] += 1
+        error("llm")
+        raise LLMUnavailable(f"Все модели недоступны: {last_error}") from last_error
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "breakers": {m: b.state for m, b in self.breakers.items()},
+            "hedge_delay": {m: round(self.hedge_delay(m), 2) for m in self.models},
+        }
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import queue
+import atexit
+import random
+import logging
+from logging.handlers import QueueHandler, QueueListener
+
+# 🪵 Логирование: запись из event loop — только постановка в очередь, форматирование
+# и вывод — в отдельном потоке. LOG_FORMAT=json — структурированные строки
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# 🎲 Болтливые категории: доля сохраняемых записей и лимит записей в секунду.
+# Формат "категория=значение" через запятую; ошибки не сэмплируются никогда
+LOG_SAMPLE = os.getenv("LOG_SAMPLE", "")
+LOG_RATE_LIMITS = os.getenv("LOG_RATE_LIMITS", "ailex.updates=10,ailex.llm=10,ailex.stream=5,ailex.rss=5,httpx=5")
+
+
+def parse_rules(spec: str) -> dict:
+    rules = {}
+    for part in (p.strip() for p in spec.split(",")):
+        name, sep, value = part.partition("=")
+        if sep and name.strip():
+            rules[name.strip()] = float(value)
+    return rules
+
+
+# 💤 Отложенное значение для %-форматирования: считается, только если запись дошла до вывода
+class lazy:
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def __str__(self):
+        return str(self.fn())
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        if record.stack_info:
+            data["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+# 🎲 Сэмплирование и лимиты по категориям (имя логгера или его родителя).
+# Фильтр стоит до очереди, поэтому отброшенная запись не стоит ни форматирования, ни вывода
+class SamplingFilter(logging.Filter):
+    def __init__(self, sample: dict, limits: dict):
+        super().__init__()
+        self.sample = sample
+        self.limits = limits
+        self._categories = {}  # имя логгера -> категория (или None)
+        self._buckets = {name: [rate, time.monotonic()] for name, rate in limits.items()}  # [токены, время]
+        self.suppressed = {}
+
+    def _category(self, name: str):
+        if name in self._categories:
+            return self._categories[name]
+        category = None
+        probe = name
+        while probe:
+            if probe in self.sample or probe in self.limits:
+                category = probe
+                break
+            probe = probe.rpartition(".")[0]
+        self._categories[name] = category
+        return category
+
+    def filter(self, record) -> bool:
+        if record.levelno >= logging.ERROR:
+            return True
+        category = self._category(record.name)
+        if category is None:
+            return True
+        rate = self.sample.get(category)
+        if rate is not None and random.random() >= rate:
+            return self._suppress(category)
+        limit = self.limits.get(category)
+        if limit is not None:
+            bucket = self._buckets[category]
+            now = time.monotonic()
+            bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+            bucket[1] = now
+            if bucket[0] < 1:
+                return self._suppress(category)
+            bucket[0] -= 1
+        return True
+
+    def _suppress(self, category: str) -> bool:
+        self.suppressed[category] = self.suppressed.get(category, 0) + 1
+        return False
+
+
+# 📥 Обычные записи уходят в очередь как есть (форматирование — в потоке слушателя);
+# ошибки форматируются сразу, чтобы текст и трейсбек зафиксировались в момент сбоя
+class LazyQueueHandler(QueueHandler):
+    def prepare(self, record):
+        if record.levelno < logging.ERROR:
+            return record
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener = None
+_sampling = None
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT) -> QueueListener:
+    global _listener, _sampling
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    handler = LazyQueueHandler(records)
+    _sampling = SamplingFilter(parse_rules(LOG_SAMPLE), parse_rules(LOG_RATE_LIMITS))
+    handler.addFilter(_sampling)
+
+    # Поля, которые формат не использует, не собираем (см. Logging HOWTO, «Optimization»)
+    logging._srcfile = None
+    logging.logThreads = False
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = QueueListener(records, output)
+    _listener.start()
+    # Хвост очереди дописывается при выходе процесса
+    atexit.register(_listener.stop)
+    return _listener
+
+
+def log_stats() -> dict:
+    return {"suppressed": dict(_sampling.suppressed) if _sampling is not None else {}}
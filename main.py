@@ -1,24 +1,39 @@
 import os
-import time
 import datetime
 import logging
 import asyncio
 import random
-from flask import Flask
-from threading import Thread
-import httpx
-import xml.etree.ElementTree as ET
 from aiogram import Bot, Dispatcher, types
+from aiogram.bot.api import TelegramAPIServer, TELEGRAM_PRODUCTION
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ParseMode
-from bs4 import BeautifulSoup
-from collections import defaultdict, deque
-
-# 🧠 Память сессий (храним до 10 сообщений на пользователя)
-user_sessions = defaultdict(lambda: deque(maxlen=10))
-last_interaction = {}  # Время последнего взаимодействия
-
-# 🪵 Настройка логирования
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+from http_client import http_clients
+from telegram_stream import reply_html, stream_reply, streaming_enabled
+from html_sanitizer import sanitize
+from scheduler import scheduler, SchedulerBusy
+from coalescer import MessageCoalescer
+from context_window import Conversation, estimate_tokens, SUMMARY_TOKEN_BUDGET
+from session_store import SessionStore, SNAPSHOT_INTERVAL
+from rss_feed import PostedIndex
+from topic_queue import FeedAggregator, TopicQueue, RSS_FEEDS, parse_feeds
+from post_buffer import PostBuffer
+from quality import default_engine
+from llm_cache import llm_cache, cache_keys
+from llm_router import ModelRouter, LLMError, LLM_MODELS
+from outbound import outbound, BULK
+from group_gate import MentionGate
+from cluster import LeaderElection, ShardGate, owns_user, sharding_problem
+from metrics import TraceMiddleware, gauge, timed, tracer, error
+from log_setup import setup_logging, lazy, log_stats
+from web_server import BOT_MODE, WEBHOOK_TOKEN, create_app, start_server, webhook_url
+
+# 🧠 Память сессий (свежие реплики в пределах бюджета токенов + резюме старых, TTL 30 мин)
+sessions = SessionStore(lambda: Conversation(summarize_history))
+gauge("ailex_active_sessions", "Sessions currently held in memory", lambda: len(sessions))
+
+# 🪵 Настройка логирования: очередь + поток вывода, сэмплирование болтливых категорий
+setup_logging()
+log_updates = logging.getLogger("ailex.updates")
+log_llm = logging.getLogger("ailex.llm")
 
 # 🔐 Переменные среды
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -34,22 +49,25 @@ logging.info(f"🔐 TOKEN загружен: {'Да' if BOT_TOKEN else 'Нет'},
 
 # 📍 ID Telegram-группы
 GROUP_ID = -1002572659328
-OPENAI_BASE_URL = "https://openrouter.ai/api/v1"
+# 🧪 Адреса API переопределяются для локальных заглушек (benchmarks/)
+OPENAI_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
 
 # 🤖 Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
+bot = Bot(token=BOT_TOKEN, server=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else TELEGRAM_PRODUCTION)
 dp = Dispatcher(bot)
 
-# 🌐 Flask-приложение для self-ping
-app = Flask(__name__)
-@app.route('/')
-def index():
-    return "Bot is alive!"
+# 🚪 Групповые сообщения без упоминания бота отсекаются до хендлеров
+# 🔬 Трасса апдейта начинается раньше фильтра, чтобы отсечённые тоже попадали в счётчик
+# 🧩 Затем отсекаются пользователи чужого шарда (при WORKER_COUNT > 1)
+mention_gate = MentionGate()
+shard_gate = ShardGate()
+dp.middleware.setup(TraceMiddleware())
+dp.middleware.setup(shard_gate)
+dp.middleware.setup(mention_gate)
 
-def run_flask():
-    logging.info("🚀 Flask запущен на 0.0.0.0:8080")
-    app.run(host="0.0.0.0", port=8080)
-    
+# 👑 Автопостинг и очистка общей базы сессий — только на инстансе-лидере
+leader = LeaderElection()
 
 # 📚 Темы для автопостинга
 TOPICS = [
@@ -60,206 +78,336 @@ TOPICS = [
     "ИИ-контент: быстро, дёшево, качественно"
 ]
 
-topic_index = 0
-rss_index = 0
-use_topic = True
+# 📡 Ленты RSS (параллельный сбор) и индекс уже использованных записей
+posted_guids = PostedIndex()
+feed_aggregator = FeedAggregator(parse_feeds(RSS_FEEDS))
+
+# 🗃️ Очередь тем: статичные темы вперемешку с ранжированными записями лент
+topic_queue = TopicQueue(TOPICS, feed_aggregator, posted_guids)
 
 # 🕒 Обновляем время последнего взаимодействия
 def update_user_session(user_id):
-    last_interaction[user_id] = time.time()
-    logging.info(f"✅ Обновлено время взаимодействия с пользователем {user_id}")
+    sessions.touch(user_id)
+    log_updates.info("✅ Обновлено время взаимодействия с пользователем %s", user_id)
 
 # 🧹 Очистка неактивных сессий
+# (лидер чистит общую базу, каждый воркер свою память — в snapshot_sessions)
+@leader.leader_only
 async def clean_inactive_sessions():
     while True:
-        current_time = time.time()
-        for user_id, last_time in list(last_interaction.items()):
-            if current_time - last_time > 1800:  # 30 мин
-                del last_interaction[user_id]
-                del user_sessions[user_id]
-                logging.info(f"❌ Сессия пользователя {user_id} удалена из-за неактивности.")
+        try:
+            purged = await asyncio.to_thread(sessions.purge)
+            if purged:
+                logging.info(f"❌ Из общей базы удалено неактивных сессий: {purged}")
+        except Exception as e:
+            logging.error(f"❌ Ошибка очистки сессий: {e}")
         await asyncio.sleep(60)
 
+# 💾 Периодический снапшот сессий на диск и выгрузка неактивных из памяти
+async def snapshot_sessions():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        for user_id in sessions.expire():
+            logging.info(f"❌ Сессия пользователя {user_id} удалена из-за неактивности.")
+        try:
+            await sessions.snapshot()
+        except Exception as e:
+            logging.error(f"❌ Ошибка снапшота сессий: {e}")
+
 # 🔘 Кнопка под постами
 def create_keyboard():
     return InlineKeyboardMarkup().add(
         InlineKeyboardButton("🤖 Обсудить с AIlex", url="https://t.me/ShilizyakaBot?start=from_post")
     )
 
-# 📡 Получение заголовков из RSS
-async def get_rss_titles():
-    RSS_FEED_URL = "https://vc.ru/rss"
-    try:
-        async with httpx.AsyncClient() as client:
-            headers = {"User-Agent": "Mozilla/5.0"}
-            r = await client.get(RSS_FEED_URL, headers=headers)
-            logging.info(f"📥 Запрос RSS: {r.status_code}")
-            if r.status_code != 200:
-                logging.warning(f"⚠️ Ответ Habr: {r.status_code}, текст: {r.text[:300]}")
-                return []
-   
-            logging.debug(f"Кодировка ответа RSS: {r.encoding}") # Логирование кодировки ответа
-            logging.debug(f"🔍 Ответ RSS: {r.text[:500]}")  # Лог первых 500 символов
-            root = ET.fromstring(r.text)
-            titles = [item.find("title").text for item in root.findall(".//item") if item.find("title") is not None]
-            logging.info(f"📚 Получено RSS-заголовков: {len(titles)}")
-            return titles
-    except Exception as e:
-        logging.error(f"❌ Ошибка при получении RSS: {e}", exc_info=True)
-        return []
-
-# 🧼 Очистка HTML-текста
+# 🧼 Очистка HTML-текста (однопроходный санитайзер вместо дерева BeautifulSoup)
 def clean_html_for_telegram(html: str) -> str:
-    allowed_tags = {"b", "strong", "i", "em", "u", "ins", "s", "strike", "del", "code", "pre", "a"}
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup.find_all(True):
-        if tag.name not in allowed_tags:
-            tag.unwrap()
-    cleaned = str(soup)
-    logging.info(f"🧼 Очищенный HTML: {cleaned[:100]}...")
-    return cleaned
+    return sanitize(html)
 
-# 🧠 Генерация ответа с OpenRouter
-async def generate_reply(user_message: list) -> str:
+SYSTEM_PROMPT = (
+    "Ты — AIlex, нейрочеловек, Telegram-эксперт по ИИ и автоматизации. "
+    "Пиши пост как для Telegram-канала: ярко, живо, с юмором, кратко и по делу. "
+    "Используй HTML-разметку: <b>жирный</b> текст, <i>курсив</i>, эмодзи, списки. "
+    "Не используй Markdown. Не объясняй, что ты ИИ. Просто сделай крутой пост!"
+)
+
+SUMMARY_PROMPT = (
+    "Ты сжимаешь историю диалога Telegram-бота AIlex с пользователем. "
+    "Объедини прежнее резюме и новые реплики в одно краткое резюме на русском: "
+    "факты о пользователе, его вопросы и что уже было отвечено. Без HTML и вступлений."
+)
+
+# 🧭 Маршрутизация по моделям: запасные модели, хеджирование, предохранители
+router = ModelRouter(OPENAI_BASE_URL)
+
+def openrouter_request(user_message: list, stream: bool = False, system_prompt: str = SYSTEM_PROMPT):
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "HTTP-Referer": "https://t.me/ShilizyakaBot",  # корректная ссылка
         "X-Title": "AIlexBot"
     }
-
-    SYSTEM_PROMPT = (
-        "Ты — AIlex, нейрочеловек, Telegram-эксперт по ИИ и автоматизации. "
-        "Пиши пост как для Telegram-канала: ярко, живо, с юмором, кратко и по делу. "
-        "Используй HTML-разметку: <b>жирный</b> текст, <i>курсив</i>, эмодзи, списки. "
-        "Не используй Markdown. Не объясняй, что ты ИИ. Просто сделай крутой пост!"
-    )
     payload = {
-        "model": "meta-llama/llama-4-maverick",
-        "messages": [{"role": "system", "content": SYSTEM_PROMPT}] + user_message
+        "model": LLM_MODELS[0],  # маршрутизатор подставит запасную модель при сбое
+        "messages": [{"role": "system", "content": system_prompt}] + user_message
     }
+    if stream:
+        payload["stream"] = True
+    return headers, payload
 
-    logging.info(f"📤 Отправка на OpenRouter: {[m['role'] + ': ' + m['content'][:60] for m in payload['messages']]}")
+# 🗃️ Пустой ответ в кеш не кладём: иначе повтор того же вопроса получит пустоту до конца TTL
+def non_empty(text) -> bool:
+    return bool(text and text.strip())
 
+# 🧠 Генерация ответа с OpenRouter
+# Одинаковые запросы (с точностью до пробелов и регистра) отдаются из кеша.
+# При недоступности всех моделей бросает LLMError
+async def generate_reply(user_message: list, system_prompt: str = SYSTEM_PROMPT, cache: bool = True) -> str:
+    headers, payload = openrouter_request(user_message, system_prompt=system_prompt)
+    with timed("generate_reply"):
+        if not cache:
+            return await request_completion(headers, payload)
+        return await llm_cache.get_or_compute(
+            cache_keys(payload["model"], payload["messages"]),
+            lambda: request_completion(headers, payload),
+            cacheable=non_empty,
+        )
+
+async def request_completion(headers: dict, payload: dict) -> str:
+    log_llm.info("📤 Отправка на OpenRouter: %s", lazy(lambda: [m["role"] + ": " + m["content"][:60] for m in payload["messages"]]))
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.post(f"{OPENAI_BASE_URL}/chat/completions", json=payload, headers=headers)
-            data = r.json()
-            if r.status_code == 200 and 'choices' in data:
-                response = data['choices'][0]['message']['content']
-                response = response.replace("<ul>", "").replace("</ul>", "").replace("<li>", "• ").replace("</li>", "")
-                logging.info("✅ Успешная генерация ответа")
-                return response
-            else:
-                logging.error(f"⚠️ Ошибка генерации: {data}")
-                return "⚠️ Ошибка генерации"
-    except Exception as e:
+        response = await router.complete(headers, payload)
+    except LLMError as e:
         logging.error(f"❌ Ошибка при генерации текста: {e}")
-        return "⚠️ Ошибка генерации"
-
-# 📏 Фильтр качества поста
-def quality_filter(text: str) -> bool:
-    if len(text.split()) < 20:
-        logging.warning("⚠️ Пост слишком короткий")
-        return False
-    if any(x in text.lower() for x in ["извин", "не могу", "как и было сказано"]):
-        logging.warning("⚠️ Пост содержит запрещённые фразы")
-        return False
-    return True
-
-# 📬 Автопостинг в Telegram-группу
-async def auto_posting():
-    global topic_index, rss_index, use_topic
-    while True:
-        topic = None
-        try:
-            logging.info(f"▶️ Цикл автопостинга. use_topic={use_topic}, topic_index={topic_index}, rss_index={rss_index}")
-            if use_topic:
-                topic = TOPICS[topic_index % len(TOPICS)]
-                topic_index += 1
-                logging.info(f"🧠 Выбрана тема из списка: {topic}")
-            else:
-                rss_titles = await get_rss_titles()
-                if rss_titles:
-                    topic = rss_titles[rss_index % len(rss_titles)]
-                    logging.info(f"📚 Заголовки RSS для постинга: {rss_titles}")
-                    rss_index += 1
-                    logging.info(f"📰 Выбрана тема из RSS: {topic}")
-                else:
-                    logging.warning("❌ Не удалось получить темы из RSS")
-            use_topic = not use_topic
-
-            if topic:
-                post = await generate_reply([{"role": "user", "content": topic}])
-                logging.info(f"📄 Сгенерирован пост: {post[:100]}...")
-                if quality_filter(post):
-                    await bot.send_message(GROUP_ID, post, reply_markup=create_keyboard(), parse_mode=ParseMode.HTML)
-                    logging.info("✅ Пост успешно отправлен в группу")
-                else:
-                    logging.warning("🚫 Пост не прошёл фильтр качества")
-            else:
-                logging.warning("⚠️ Не выбрана тема для генерации поста")
+        raise
+    log_llm.info("✅ Успешная генерация ответа")
+    return response
+
+# 🗜️ Сворачивание старых реплик в резюме (вызывается фоном, не на пути ответа)
+async def summarize_history(summary: str, turns: list) -> str:
+    dialog = "\n".join(f"{role}: {content}" for role, content in turns)
+    prompt = (
+        f"Прежнее резюме: {summary or 'нет'}\n\nНовые реплики:\n{dialog}\n\n"
+        f"Уложись примерно в {SUMMARY_TOKEN_BUDGET} токенов."
+    )
+    return await generate_reply([{"role": "user", "content": prompt}], system_prompt=SUMMARY_PROMPT)
 
-        except Exception as e:
-            logging.error(f"❌ Ошибка автопостинга: {e}")
+# 🌊 Потоковая генерация (SSE): отдаёт текст по мере прихода токенов
+async def generate_reply_stream(user_message: list):
+    headers, payload = openrouter_request(user_message, stream=True)
+    log_llm.info("📤 Стриминг с OpenRouter, сообщений: %d", len(payload["messages"]))
+    async for delta in router.stream(headers, payload):
+        yield delta
+    log_llm.info("✅ Успешная потоковая генерация ответа")
 
-        delay = 1800
-        logging.info(f"⏳ Ожидание {delay} сек до следующего поста...")
-        await asyncio.sleep(delay)
+# 📏 Фильтр качества и оценка постов: запрещённые фразы, длина, почти-дубликаты отправленного
+quality = default_engine()
 
-# 🔁 Self-ping для Render
+def quality_filter(text: str) -> bool:
+    return quality.accept(text)
+
+def post_score(text: str) -> float:
+    return quality.score(text)
+
+# 🧠 Тема для следующего поста. Недавние темы пропускаем до генерации, чтобы не платить
+# за заведомый дубль; такая запись ленты помечается использованной, остальные — после отправки
+async def next_post_topic():
+    for _ in range(len(TOPICS) * 2):
+        topic, source, guid = await topic_queue.next()
+        if quality.topic_allowed(topic):
+            break
+        if guid:
+            posted_guids.add(guid)
+        logging.info(f"⏭️ Тема недавно была, пропускаем: {topic}")
+    logging.info(f"🧠 Выбрана тема ({source}): {topic}")
+    return topic, source, guid
+
+# 📦 Посты готовятся заранее: несколько кандидатов на тему, в буфер идёт лучший
+# ✍️ Кандидат поста: уже очищенный HTML, чтобы фильтр и оценка видели то, что уйдёт в группу.
+# Кандидаты должны различаться, а повтор темы не должен давать тот же пост — без кеша
+async def generate_post(topic: str) -> str:
+    return clean_html_for_telegram(await generate_reply([{"role": "user", "content": topic}], cache=False))
+
+# ↩️ Тема из ленты, не давшая поста, возвращается в очередь при следующем пополнении
+async def release_post_topic(topic: str, source: str, guid: str):
+    if guid:
+        await topic_queue.release(topic)
+
+post_buffer = PostBuffer(
+    next_post_topic,
+    generate_post,
+    quality_filter,
+    post_score,
+    release_post_topic,
+)
+
+# ♻️ Новый лидер перечитывает то, что предыдущий успел опубликовать
+leader.on_elected(posted_guids.load)
+leader.on_elected(topic_queue.load)
+leader.on_elected(quality.load)
+
+# 📬 Автопостинг в Telegram-группу; буфер постов работает, только пока мы лидер
+@leader.leader_only
+async def auto_posting():
+    post_buffer.start()
+    try:
+        while True:
+            try:
+                logging.info(f"▶️ Цикл автопостинга. Буфер постов: {post_buffer.stats()}")
+                post = await post_buffer.get()
+                logging.info(f"📄 Пост из буфера ({post['source']}): {post['text'][:100]}...")
+                # Пока пост лежал в буфере, в группу мог уйти похожий
+                if quality.is_duplicate(post["text"]):
+                    logging.warning(f"🚫 Почти такой же пост уже был, пропускаем: {post['topic']}")
+                    if post["guid"]:
+                        posted_guids.add(post["guid"])
+                    continue
+                await outbound.send(
+                    GROUP_ID,
+                    lambda: bot.send_message(GROUP_ID, post["text"], reply_markup=create_keyboard(), parse_mode=ParseMode.HTML),
+                    priority=BULK,
+                )
+                # Запись ленты считается использованной только после успешной отправки
+                if post["guid"]:
+                    posted_guids.add(post["guid"])
+                await quality.remember(post["text"], post["topic"])
+                logging.info("✅ Пост успешно отправлен в группу")
+
+            except Exception as e:
+                error("autopost")
+                logging.error(f"❌ Ошибка автопостинга: {e}")
+
+            delay = 1800
+            logging.info(f"⏳ Ожидание {delay} сек до следующего поста...")
+            await asyncio.sleep(delay)
+    finally:
+        await post_buffer.stop()
+
+# 🔁 Self-ping для Render (нужен только в режиме polling — вебхуки и так будят инстанс)
 async def self_ping():
     while True:
         try:
-            async with httpx.AsyncClient() as client:
-                r = await client.get(SELF_URL)
-                logging.info(f"📡 Self-ping: {r.status_code}")
+            r = await http_clients.get(SELF_URL).get(SELF_URL)
+            logging.info(f"📡 Self-ping: {r.status_code}")
         except Exception as e:
+            http_clients.record_error(SELF_URL)
             logging.error(f"❌ Self-ping error: {e}")
         await asyncio.sleep(600)
 
+# 📊 Периодический отчёт о состоянии подсистем
+async def report_stats():
+    while True:
+        await asyncio.sleep(600)
+        logging.info(f"📊 HTTP-пулы: {http_clients.stats()}")
+        logging.info(f"🚦 Планировщик: {scheduler.stats()}")
+        logging.info(f"🧩 Склейка сообщений: {coalescer.stats()}")
+        logging.info(f"🚪 Фильтр групп: {mention_gate.stats()}")
+        logging.info(f"👑 Кластер: {leader.stats()}, шард: {shard_gate.stats()}")
+        logging.info(f"📡 Ленты: {feed_aggregator.stats()}")
+        logging.info(f"📦 Буфер постов: {post_buffer.stats()}")
+        logging.info(f"🏅 Качество постов: {quality.stats()}")
+        logging.info(f"🗃️ Кеш LLM: {llm_cache.stats()}")
+        logging.info(f"🧭 Маршрутизатор моделей: {router.stats()}")
+        logging.info(f"📮 Исходящие: {outbound.stats()}")
+        logging.info(f"🪵 Логи: {log_stats()}")
+
 # /start обработчик
 @dp.message_handler(commands=["start"])
 async def start_handler(msg: types.Message):
     if msg.chat.type == "private":
-        logging.info(f"👋 /start от {msg.from_user.id}")
-        await msg.reply("Привет! 👋 Я — AIlex, твой помощник по ИИ и автоматизации. Чем могу помочь?")
+        log_updates.info("👋 /start от %s", msg.from_user.id)
+        await outbound.send(msg.chat.id, lambda: msg.reply("Привет! 👋 Я — AIlex, твой помощник по ИИ и автоматизации. Чем могу помочь?"))
 
-# 💬 Ответ на входящие сообщения
+# 💬 Ответ на входящие сообщения (из групп сюда доходят только упоминания — см. MentionGate)
 @dp.message_handler()
 async def reply_handler(msg: types.Message):
     user_id = msg.from_user.id
     update_user_session(user_id)
+    log_updates.info("📨 Сообщение от %s: %.100s", user_id, msg.text)
+    coalescer.add(user_id, mention_gate.strip_mention(msg.text), msg)
 
-    user_text = msg.text.strip()
-    bot_me = await bot.get_me()
-    logging.info(f"📨 Сообщение от {user_id}: {user_text[:100]}")
-
-    cleaned = user_text.replace(f"@{bot_me.username}", "").strip()
+# 🚦 Генерации идут через планировщик: по одной на пользователя, с общим лимитом
+async def schedule_answer(msg: types.Message, user_id, text: str):
+    try:
+        await scheduler.submit(user_id, lambda: answer(msg, user_id, text))
+    except SchedulerBusy:
+        await outbound.send(msg.chat.id, lambda: msg.reply("🚦 Сейчас много запросов, попробуй через минутку!"))
 
-    if msg.chat.type in ["group", "supergroup"]:
-        if f"@{bot_me.username}" in msg.text:
-            user_sessions[user_id].append({"role": "user", "content": cleaned})
-            messages = list(user_sessions[user_id])
-            response = await generate_reply(messages)
-            user_sessions[user_id].append({"role": "assistant", "content": response})
-            await msg.reply(clean_html_for_telegram(response), parse_mode=ParseMode.HTML)
-        return
+coalescer = MessageCoalescer(lambda user_id, text, msg: schedule_answer(msg, user_id, text))
 
-    user_sessions[user_id].append({"role": "user", "content": cleaned})
-    messages = list(user_sessions[user_id])
-    response = await generate_reply(messages)
-    user_sessions[user_id].append({"role": "assistant", "content": response})
-    await msg.reply(clean_html_for_telegram(response), parse_mode=ParseMode.HTML)
+# 🗣️ Генерация и отправка ответа (потоково или целиком — по типу чата)
+async def answer(msg: types.Message, user_id, text: str):
+    # Генерация идёт в задаче планировщика, вне апдейта — у неё своя трасса
+    trace = tracer.begin(f"answer {user_id}")
+    try:
+        # В историю пишем только после ответа: отменённая генерация не оставляет следов
+        conversation = sessions.get(user_id)
+        messages = conversation.messages(reserve=estimate_tokens(text)) + [{"role": "user", "content": text}]
+        try:
+            if streaming_enabled(msg.chat.type):
+                response = await stream_answer(msg, messages)
+            else:
+                response = await generate_reply(messages)
+                with tracer.span("reply"):
+                    await reply_html(msg, response)
+        except LLMError:
+            # Сбой генерации в историю не попадает — пользователь может просто повторить
+            await outbound.send(msg.chat.id, lambda: msg.reply("⚠️ Не получилось ответить, попробуй ещё раз чуть позже."))
+            return
+        conversation.append({"role": "user", "content": text})
+        conversation.append({"role": "assistant", "content": response})
+    finally:
+        tracer.end(trace)
+
+# 🌊 Потоковый ответ; попадание в кеш отдаём сразу, без плейсхолдера и правок
+async def stream_answer(msg: types.Message, messages: list) -> str:
+    _, payload = openrouter_request(messages)
+    keys = cache_keys(payload["model"], payload["messages"])
+    response = await llm_cache.get(keys)
+    if non_empty(response):
+        await reply_html(msg, response)
+        return response
+
+    with timed("generate_reply_stream"):
+        response = await stream_reply(msg, generate_reply_stream(messages))
+    if non_empty(response):
+        await llm_cache.put(keys, response)
+    return response
 
 # 🚀 Главная точка запуска
 async def main():
-    logging.info("🚀 Инициализация бота...")
-    asyncio.create_task(self_ping())
-    asyncio.create_task(auto_posting())
-    asyncio.create_task(clean_inactive_sessions())
-    await dp.start_polling()
-
-# 🔧 Запуск Flask и бота
+    logging.info(f"🚀 Инициализация бота (режим: {BOT_MODE})...")
+    problem = sharding_problem(BOT_MODE)
+    if problem:
+        logging.critical(f"❌ {problem}")
+        exit(1)
+    await asyncio.to_thread(sessions.restore, owns=owns_user)
+    await mention_gate.load_identity(bot)
+    asyncio.create_task(snapshot_sessions())
+    asyncio.create_task(report_stats())
+    scheduler.start()
+    outbound.start()
+    leader.start()
+    runner = await start_server(create_app(dp, with_webhook=BOT_MODE == "webhook"))
+    try:
+        if BOT_MODE == "webhook":
+            await bot.set_webhook(webhook_url(), secret_token=WEBHOOK_TOKEN or None)
+            logging.info(f"🪝 Вебхук установлен: {webhook_url()}")
+            await asyncio.Event().wait()
+        else:
+            await bot.delete_webhook()
+            asyncio.create_task(self_ping())
+            await dp.start_polling()
+    finally:
+        await runner.cleanup()
+        await scheduler.stop()
+        await leader.stop()
+        await outbound.stop()
+        await sessions.snapshot()
+        logging.info(f"🚦 Планировщик: {scheduler.stats()}")
+        logging.info(f"📊 HTTP-пулы перед остановкой: {http_clients.stats()}")
+        await http_clients.aclose()
+        await (await bot.get_session()).close()
+
+# 🔧 Запуск бота
 if __name__ == "__main__":
-    Thread(target=run_flask).start()
     asyncio.run(main())
@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import hmac
+import logging
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from aiohttp import web
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+# 📈 Метрики в текстовом формате Prometheus без внешних зависимостей
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 🔬 Трассировка апдейтов: стартовое состояние; переключается на лету через POST /trace
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "0") == "1"
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "100"))
+# Токен для /trace; без него переключатель выключен (по умолчанию — секрет вебхука)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or os.getenv("WEBHOOK_SECRET", "")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values = {}  # tuple(labels) -> число
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self._values.items():
+            lines.append(f"{self.name}{_labels(dict(key))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._series = {}  # tuple(labels) -> [счётчики по корзинам, сумма, количество]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    # ⏱️ Замер блока: with LATENCY.time(op="..."): ...
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in self._series.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(labels)} {count}")
+        return lines
+
+
+# 📏 Значение, которое считается в момент запроса /metrics (например, число сессий)
+class Gauge:
+    def __init__(self, name: str, help: str, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+LATENCY = registry.register(Histogram("ailex_latency_seconds", "Latency of external calls and local processing by operation"))
+ERRORS = registry.register(Counter("ailex_errors_total", "Errors by subsystem"))
+QUALITY_REJECTIONS = registry.register(Counter("ailex_quality_rejections_total", "Autopost candidates rejected by quality check"))
+UPDATES = registry.register(Counter("ailex_updates_total", "Incoming Telegram updates"))
+
+
+def gauge(name: str, help: str, read) -> Gauge:
+    return registry.register(Gauge(name, help, read))
+
+
+# 🔬 Трассировка: спаны текущего апдейта копятся в contextvar и логируются одной строкой
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+class Tracer:
+    def __init__(self, enabled: bool = TRACE_ENABLED, keep: int = TRACE_KEEP):
+        self.enabled = enabled
+        self.recent = deque(maxlen=keep)
+
+    # Выключенная трассировка тоже ставит None, чтобы вложенные задачи не писали в чужую трассу
+    def begin(self, name: str):
+        trace = None
+        if self.enabled:
+            trace = {"name": name, "started": time.time(), "t0": time.perf_counter(), "spans": []}
+        return _current_trace.set(trace)
+
+    def end(self, token):
+        trace = _current_trace.get()
+        _current_trace.reset(token)
+        if trace is None:
+            return
+        trace["duration"] = round(time.perf_counter() - trace.pop("t0"), 4)
+        self.recent.append(trace)
+        logging.info(f"🔬 {trace['name']} {trace['duration']:.3f} сек: "
+                     + ", ".join(f"{s['name']}={s['duration']:.3f}" for s in trace["spans"]))
+
+    # 🔬 Спан внутри текущего апдейта; вне апдейта или при выключенной трассировке — пустышка
+    @contextmanager
+    def span(self, name: str):
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            trace["spans"].append({
+                "name": name,
+                "offset": round(started - trace["t0"], 4),
+                "duration": round(time.perf_counter() - started, 4),
+            })
+
+
+tracer = Tracer()
+
+
+# 🔬 Трасса на каждый апдейт: от входа в диспетчер до выхода из хендлеров
+class TraceMiddleware(BaseMiddleware):
+    async def on_pre_process_update(self, update, data: dict):
+        UPDATES.inc()
+        data["trace_token"] = tracer.begin(f"update {update.update_id}")
+
+    async def on_post_process_update(self, update, results, data: dict):
+        tracer.end(data.get("trace_token"))
+
+
+# ⏱️ Замер операции: гистограмма задержек + спан в трассе текущего апдейта
+@contextmanager
+def timed(op: str):
+    with tracer.span(op), LATENCY.time(op=op):
+        yield
+
+
+def error(kind: str):
+    ERRORS.inc(kind=kind)
+
+
+async def metrics_handler(request):
+    return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+
+# 🔬 Последние трассы; POST /trace?enabled=1|0 включает/выключает сбор. В именах трасс
+# есть id пользователей, поэтому и чтение, и переключение — только с заголовком X-Metrics-Token
+async def trace_handler(request):
+    token = request.headers.get("X-Metrics-Token", "")
+    if not METRICS_TOKEN or not hmac.compare_digest(token, METRICS_TOKEN):
+        raise web.HTTPUnauthorized()
+    if request.method == "POST":
+        tracer.enabled = request.query.get("enabled", "1") == "1"
+        logging.info(f"🔬 Трассировка {'включена' if tracer.enabled else 'выключена'}")
+    body = {"enabled": tracer.enabled, "traces": list(tracer.recent)}
+    return web.Response(text=json.dumps(body, ensure_ascii=False), content_type="application/json")
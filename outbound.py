@@ -0,0 +1,237 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+from aiogram.utils.exceptions import MessageNotModified, RetryAfter
+
+from scheduler import percentile
+from metrics import timed, error
+
+# 🚥 Лимиты Telegram: ~30 сообщений/сек на бота, ~1/сек в личку, ~20/мин в группу
+GLOBAL_RATE = float(os.getenv("TG_GLOBAL_RATE", "25"))
+PRIVATE_RATE = float(os.getenv("TG_PRIVATE_RATE", "1"))
+GROUP_RATE = float(os.getenv("TG_GROUP_RATE", str(20 / 60)))
+GROUP_BURST = float(os.getenv("TG_GROUP_BURST", "3"))
+SEND_RETRIES = int(os.getenv("TG_SEND_RETRIES", "3"))
+# Как часто выбрасывать бакеты простаивающих чатов (полный бакет равен новому)
+BUCKET_SWEEP_INTERVAL = float(os.getenv("TG_BUCKET_SWEEP_INTERVAL", "60"))
+
+# Полосы приоритета: ответы пользователям раньше автопостов
+INTERACTIVE = 0
+BULK = 1
+
+
+# 🪣 Токен-бакет: rate токенов в секунду, не больше capacity
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("chat_id", "priority", "seq", "factory", "future", "enqueued_at", "key", "attempts")
+
+    def __init__(self, chat_id, priority, seq, factory, future, key):
+        self.chat_id = chat_id
+        self.priority = priority
+        self.seq = seq
+        self.factory = factory
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        self.key = key
+        self.attempts = 0
+
+
+# 📮 Конвейер исходящих: бакеты на чат и глобальный, приоритеты, пауза чата по RetryAfter.
+# В пределах чата порядок сохраняется, чаты между собой друг друга не ждут
+class SendPipeline:
+    def __init__(self):
+        self._global = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats = {}         # chat_id -> TokenBucket
+        self._queues = {}        # chat_id -> deque[_Job] (по порядку поступления)
+        self._paused = {}        # chat_id -> monotonic-время конца паузы
+        self._busy = set()       # чаты с отправкой в полёте
+        self._keys = {}          # key -> _Job, ожидающий отправки (для замены правок)
+        self._seq = 0
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._delays = deque(maxlen=500)
+        self._swept_at = time.monotonic()
+        self._stats = {"sent": 0, "failed": 0, "retry_after": 0, "replaced": 0, "not_modified": 0, "evicted": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательные id — группы и каналы
+            bucket = TokenBucket(GROUP_RATE, GROUP_BURST) if chat_id < 0 else TokenBucket(PRIVATE_RATE, 1)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    # 📤 Поставить отправку в очередь; factory — функция без аргументов, возвращающая корутину.
+    # Задание с тем же key, ещё не ушедшее, заменяется (актуальна только последняя правка)
+    async def send(self, chat_id, factory, priority: int = INTERACTIVE, key=None):
+        loop = asyncio.get_running_loop()
+        if key is not None:
+            old = self._keys.get(key)
+            if old is not None and not old.future.done():
+                old.factory = factory
+                self._stats["replaced"] += 1
+                return await asyncio.shield(old.future)
+
+        self._seq += 1
+        job = _Job(chat_id, priority, self._seq, factory, loop.create_future(), key)
+        self._queues.setdefault(chat_id, deque()).append(job)
+        if key is not None:
+            self._keys[key] = job
+        self._wakeup.set()
+        return await job.future
+
+    def _next_ready(self, now: float):
+        best = None
+        wait = None
+        for chat_id, queue in self._queues.items():
+            if not queue or chat_id in self._busy:
+                continue
+            job = min(queue, key=lambda j: (j.priority, j.seq))
+            delay = max(self._paused.get(chat_id, 0) - now, self._bucket(chat_id).wait_time(now))
+            if delay > 0:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+            if best is None or (job.priority, job.seq) < (best.priority, best.seq):
+                best = job
+        return best, wait
+
+    async def _dispatch(self):
+        while True:
+            self._wakeup.clear()
+            now = time.monotonic()
+            if now - self._swept_at >= BUCKET_SWEEP_INTERVAL:
+                self._sweep(now)
+            job, wait = self._next_ready(now)
+            if job is not None and job.future.cancelled():
+                # Отправитель передумал (например, генерацию отменили) — токены не тратим
+                self._drop(job)
+                continue
+            if job is not None:
+                global_wait = self._global.wait_time(now)
+                if global_wait > 0:
+                    await asyncio.sleep(global_wait)
+                    continue
+                self._global.take()
+                self._bucket(job.chat_id).take()
+                self._drop(job)
+                self._busy.add(job.chat_id)
+                asyncio.create_task(self._execute(job))
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    # 🧹 Бакеты и паузы заводятся на каждый чат — без чистки они копились бы весь срок жизни процесса
+    def _sweep(self, now: float):
+        self._swept_at = now
+        for chat_id, until in list(self._paused.items()):
+            if until <= now:
+                del self._paused[chat_id]
+        for chat_id, bucket in list(self._chats.items()):
+            if chat_id in self._queues or chat_id in self._busy or chat_id in self._paused:
+                continue
+            if bucket.is_full(now):
+                del self._chats[chat_id]
+                self._stats["evicted"] += 1
+
+    def _drop(self, job: _Job):
+        queue = self._queues[job.chat_id]
+        queue.remove(job)
+        if not queue and job.chat_id not in self._busy:
+            del self._queues[job.chat_id]
+        if self._keys.get(job.key) is job:
+            del self._keys[job.key]
+
+    async def _execute(self, job: _Job):
+        self._delays.append(time.monotonic() - job.enqueued_at)
+        job.attempts += 1
+        try:
+            with timed("telegram_send"):
+                result = await job.factory()
+        except RetryAfter as e:
+            # Флуд-контроль: на паузу уходит только этот чат, задание возвращается в голову очереди
+            self._stats["retry_after"] += 1
+            self._paused[job.chat_id] = time.monotonic() + e.timeout
+            logging.warning(f"🚥 RetryAfter {e.timeout} сек для чата {job.chat_id}")
+            if job.attempts <= SEND_RETRIES and not job.future.done():
+                self._queues.setdefault(job.chat_id, deque()).appendleft(job)
+            elif not job.future.done():
+                self._stats["failed"] += 1
+                error("telegram")
+                job.future.set_exception(e)
+        except MessageNotModified as e:
+            # Правка совпала с текущим текстом — безвредная пустая операция, не сбой
+            self._stats["not_modified"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+        except Exception as e:
+            self._stats["failed"] += 1
+            error("telegram")
+            if not job.future.done():
+                job.future.set_exception(e)
+        else:
+            self._stats["sent"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        finally:
+            self._busy.discard(job.chat_id)
+            queue = self._queues.get(job.chat_id)
+            if queue is not None and not queue:
+                del self._queues[job.chat_id]
+            self._wakeup.set()
+
+    def stats(self) -> dict:
+        delays = sorted(self._delays)
+        lanes = {"interactive": 0, "bulk": 0}
+        for queue in self._queues.values():
+            for job in queue:
+                lanes["interactive" if job.priority == INTERACTIVE else "bulk"] += 1
+        now = time.monotonic()
+        return {
+            **self._stats,
+            "queued": lanes,
+            "paused_chats": sum(1 for until in self._paused.values() if until > now),
+            "chat_buckets": len(self._chats),
+            "delay_avg": round(sum(delays) / len(delays), 3) if delays else 0.0,
+            "delay_p95": round(percentile(delays, 0.95), 3),
+            "delay_max": round(delays[-1], 3) if delays else 0.0,
+        }
+
+
+outbound = SendPipeline()
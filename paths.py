@@ -0,0 +1,9 @@
+import os
+
+# 💾 Каталог локального кеша и состояния: ленты, индекс записей, SQLite-хранилище.
+# RSS_CACHE_DIR — прежнее имя переменной, пока поддерживается
+CACHE_DIR = os.getenv("CACHE_DIR") or os.getenv("RSS_CACHE_DIR", ".cache")
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, name)
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import logging
+
+# 📦 Буфер готовых постов и число кандидатов на тему
+POST_BUFFER_SIZE = int(os.getenv("POST_BUFFER_SIZE", "2"))
+POST_CANDIDATES = int(os.getenv("POST_CANDIDATES", "3"))
+POST_RETRY_DELAY = float(os.getenv("POST_RETRY_DELAY", "60"))
+
+
+# 📦 Фоновый производитель: заранее готовит отфильтрованные посты,
+# чтобы слот автопостинга не зависел от скорости OpenRouter
+class PostBuffer:
+    def __init__(self, next_topic, generate, accept, score, release=None,
+                 size: int = POST_BUFFER_SIZE, candidates: int = POST_CANDIDATES):
+        self._next_topic = next_topic  # async () -> (topic, source, guid)
+        self._release = release        # async (topic, source, guid) -> None: тема не дала поста
+        self._generate = generate      # async (topic) -> str
+        self._accept = accept          # (post) -> bool
+        self._score = score            # (post) -> float
+        self.candidates = candidates
+        self._queue = asyncio.Queue(maxsize=size)
+        self._task = None
+        self._stats = {"topics": 0, "generated": 0, "rejected": 0, "produced": 0, "empty_topics": 0, "errors": 0}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # 📤 Готовый пост: мгновенно, если буфер заполнен, иначе ждём производителя
+    async def get(self) -> dict:
+        return await self._queue.get()
+
+    async def _run(self):
+        while True:
+            try:
+                post = await self._produce()
+            except Exception as e:
+                logging.error(f"❌ Ошибка подготовки поста: {e}")
+                post = None
+            if post is None:
+                await asyncio.sleep(POST_RETRY_DELAY)
+                continue
+            # put() ждёт, пока в буфере освободится место
+            await self._queue.put(post)
+            logging.info(f"📦 Пост в буфере ({self._queue.qsize()}/{self._queue.maxsize}): {post['topic']}")
+
+    async def _produce(self):
+        topic, source, guid = await self._next_topic()
+        self._stats["topics"] += 1
+        results = await asyncio.gather(
+            *(self._generate(topic) for _ in range(self.candidates)), return_exceptions=True
+        )
+        posts = [r for r in results if isinstance(r, str)]
+        self._stats["errors"] += len(results) - len(posts)
+        self._stats["generated"] += len(posts)
+        accepted = [p for p in posts if self._accept(p)]
+        self._stats["rejected"] += len(posts) - len(accepted)
+        if not accepted:
+            self._stats["empty_topics"] += 1
+            logging.warning(f"🚫 Ни один из {len(posts)} кандидатов не прошёл фильтр: {topic}")
+            if self._release is not None:
+                await self._release(topic, source, guid)
+            return None
+        self._stats["produced"] += 1
+        return {"topic": topic, "source": source, "guid": guid, "text": max(accepted, key=self._score)}
+
+    def stats(self) -> dict:
+        generated = self._stats["generated"]
+        return {
+            **self._stats,
+            "buffered": self._queue.qsize(),
+            "capacity": self._queue.maxsize,
+            "rejection_rate": round(self._stats["rejected"] / generated, 3) if generated else 0.0,
+        }
@@ -0,0 +1,210 @@
+import os
+import re
+import time
+import random
+import asyncio
+import hashlib
+import logging
+from collections import deque
+
+from state_backend import StateBackend, state_backend
+from topic_queue import title_key
+from metrics import QUALITY_REJECTIONS
+
+# 🚫 Запрещённые фразы (через запятую в QUALITY_BANNED_PHRASES добавляются к базовым)
+BANNED_PHRASES = ["извин", "не могу", "как и было сказано"] + [
+    p.strip() for p in os.getenv("QUALITY_BANNED_PHRASES", "").split(",") if p.strip()
+]
+QUALITY_MIN_WORDS = int(os.getenv("QUALITY_MIN_WORDS", "20"))
+# Посты со сходством Жаккара (по словам и парам слов) не ниже этого считаются почти одинаковыми
+QUALITY_SIMILARITY = float(os.getenv("QUALITY_SIMILARITY", "0.6"))
+QUALITY_INDEX_SIZE = int(os.getenv("QUALITY_INDEX_SIZE", "1000"))
+# Та же тема раньше этого срока не генерируется (статичные темы идут по кругу ~раз в 5 часов)
+QUALITY_TOPIC_COOLDOWN = int(os.getenv("QUALITY_TOPIC_COOLDOWN", str(4 * 3600)))
+
+_TAGS = re.compile(r"<[^<>]*>")
+_WORDS = re.compile(r"\w+")
+# MinHash: 64 хеш-функции вида (a·h + b) mod p, в индексе 16 полос по 4 значения
+MINHASH_PERMUTATIONS = 64
+MINHASH_BANDS = 16
+_PRIME = (1 << 61) - 1
+_MASK = (1 << 32) - 1
+_rng = random.Random(61)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+
+
+# 🔎 Один скомпилированный автомат вместо линейного перебора фраз
+class PhraseMatcher:
+    def __init__(self, phrases: list):
+        alternatives = sorted({p.casefold() for p in phrases}, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def find(self, text: str):
+        if self._pattern is None:
+            return None
+        m = self._pattern.search(text.casefold())
+        return m.group(0) if m else None
+
+
+def words(text: str) -> list:
+    return _WORDS.findall(_TAGS.sub(" ", text).casefold())
+
+
+# 🧬 Признаки поста — слова и пары соседних слов: замена одного слова меняет
+# лишь три признака, поэтому слегка переписанный пост остаётся похожим на исходный
+def shingles(text: str) -> set:
+    tokens = words(text)
+    return set(tokens) | {f"{a} {b}" for a, b in zip(tokens, tokens[1:])}
+
+
+# 🧬 MinHash-подпись: доля совпавших позиций двух подписей оценивает сходство Жаккара
+def minhash(text: str) -> tuple:
+    hashes = [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+              for s in shingles(text)] or [0]
+    return tuple(min((a * h + b) % _PRIME for h in hashes) & _MASK for a, b in _PERMUTATIONS)
+
+
+def similarity(left: tuple, right: tuple) -> float:
+    return sum(x == y for x, y in zip(left, right)) / len(left)
+
+
+def encode_signature(signature: tuple) -> str:
+    return "".join(f"{v:08x}" for v in signature)
+
+
+def decode_signature(value: str) -> tuple:
+    return tuple(int(value[i:i + 8], 16) for i in range(0, len(value), 8))
+
+
+# 🗂️ LSH-индекс подписей отправленных постов. Подпись режется на полосы: у похожих постов
+# хотя бы одна полоса почти наверняка совпадает, поэтому сходство считаем только для
+# кандидатов из своих корзин, а не для всего индекса
+class MinHashIndex:
+    def __init__(self, threshold: float = QUALITY_SIMILARITY, size: int = QUALITY_INDEX_SIZE,
+                 bands: int = MINHASH_BANDS):
+        self.threshold = threshold
+        self._bands = bands
+        self._rows = MINHASH_PERMUTATIONS // bands
+        self._entries = deque(maxlen=size)
+        self._buckets = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys(self, signature: tuple):
+        return [signature[band * self._rows:(band + 1) * self._rows] for band in range(self._bands)]
+
+    def add(self, signature: tuple):
+        if len(self._entries) == self._entries.maxlen:
+            self._discard(self._entries[0])
+        self._entries.append(signature)
+        for bucket, key in zip(self._buckets, self._keys(signature)):
+            bucket.setdefault(key, []).append(signature)
+
+    def _discard(self, signature: tuple):
+        for bucket, key in zip(self._buckets, self._keys(signature)):
+            candidates = bucket.get(key)
+            if candidates:
+                candidates.remove(signature)
+                if not candidates:
+                    del bucket[key]
+
+    def nearest(self, signature: tuple):
+        for bucket, key in zip(self._buckets, self._keys(signature)):
+            for candidate in bucket.get(key, ()):
+                if similarity(candidate, signature) >= self.threshold:
+                    return candidate
+        return None
+
+    def signatures(self) -> list:
+        return list(self._entries)
+
+
+# 🏅 Движок качества: проверки (имя → (text) -> bool) и взвешенные оценки,
+# плюс память об отправленных постах и темах в общем хранилище
+class QualityEngine:
+    def __init__(self, state: StateBackend = state_backend, key: str = "quality_index",
+                 topic_cooldown: int = QUALITY_TOPIC_COOLDOWN):
+        self.state = state
+        self.key = key
+        self.topic_cooldown = topic_cooldown
+        self.checks = {}
+        self.scorers = []
+        self._stats = {"checked": 0, "accepted": 0, "rejected": {}, "topics_skipped": 0}
+        self.load()
+
+    # ♻️ Индекс из хранилища: при старте и когда инстанс становится лидером
+    def load(self):
+        state = self.state.get(self.key, {})
+        self.index = MinHashIndex()
+        for signature in state.get("signatures", []):
+            self.index.add(decode_signature(signature))
+        self._topics = state.get("topics", {})  # ключ темы -> время последнего поста
+
+    def add_check(self, name: str, check):
+        self.checks[name] = check
+        return check
+
+    def add_scorer(self, scorer, weight: float = 1.0):
+        self.scorers.append((scorer, weight))
+        return scorer
+
+    # ✅ Первая не пройденная проверка — причина отказа, None — пост годится
+    def rejection(self, text: str):
+        self._stats["checked"] += 1
+        for name, check in self.checks.items():
+            if not check(text):
+                self._stats["rejected"][name] = self._stats["rejected"].get(name, 0) + 1
+                QUALITY_REJECTIONS.inc(reason=name)
+                return name
+        self._stats["accepted"] += 1
+        return None
+
+    def accept(self, text: str) -> bool:
+        reason = self.rejection(text)
+        if reason is not None:
+            logging.warning(f"🚫 Пост отклонён фильтром «{reason}»")
+        return reason is None
+
+    def score(self, text: str) -> float:
+        return sum(weight * scorer(text) for scorer, weight in self.scorers)
+
+    def is_duplicate(self, text: str) -> bool:
+        return self.index.nearest(minhash(text)) is not None
+
+    # ⏳ Проверка темы до генерации: недавнюю тему не оплачиваем повторно
+    def topic_allowed(self, topic: str) -> bool:
+        posted_at = self._topics.get(title_key(topic))
+        if posted_at is not None and time.time() - posted_at < self.topic_cooldown:
+            self._stats["topics_skipped"] += 1
+            return False
+        return True
+
+    # 📝 Пост ушёл в группу — запоминаем подпись и тему
+    async def remember(self, text: str, topic: str = None):
+        self.index.add(minhash(text))
+        now = time.time()
+        if topic:
+            self._topics[title_key(topic)] = now
+        self._topics = {k: t for k, t in self._topics.items() if now - t < self.topic_cooldown}
+        state = {"signatures": [encode_signature(sig) for sig in self.index.signatures()], "topics": self._topics}
+        await asyncio.to_thread(self.state.set, self.key, state)
+
+    def stats(self) -> dict:
+        return {**self._stats, "indexed_posts": len(self.index), "recent_topics": len(self._topics)}
+
+
+# 📏 Базовые правила фильтра и оценки постов
+banned_phrases = PhraseMatcher(BANNED_PHRASES)
+
+
+def default_engine() -> QualityEngine:
+    engine = QualityEngine()
+    engine.add_check("too_short", lambda text: len(words(text)) >= QUALITY_MIN_WORDS)
+    engine.add_check("banned_phrase", lambda text: banned_phrases.find(text) is None)
+    engine.add_check("duplicate", lambda text: not engine.is_duplicate(text))
+    # Длина ближе к 800 символам, наличие разметки и списков
+    engine.add_scorer(lambda text: -abs(len(text) - 800) / 800)
+    engine.add_scorer(lambda text: "<b>" in text, 0.2)
+    engine.add_scorer(lambda text: "•" in text, 0.1)
+    return engine
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import xml.etree.ElementTree as ET
+
+from http_client import http_clients
+from paths import cache_path
+
+# 📡 Кеш RSS и индекс уже использованных записей
+RSS_CACHE_TTL = int(os.getenv("RSS_CACHE_TTL", "900"))
+RSS_MAX_ITEMS = int(os.getenv("RSS_MAX_ITEMS", "30"))
+RSS_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+ATOM_ENTRY = "{http://www.w3.org/2005/Atom}entry"
+
+log = logging.getLogger("ailex.rss")
+
+
+def write_json(path: str, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def read_json(path: str, default):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+# 🗂️ Индекс GUID, по которым уже сгенерирован пост (append-only лог)
+class PostedIndex:
+    def __init__(self, path: str = None):
+        self.path = path or cache_path("posted_guids.log")
+        self.load()
+
+    # ♻️ Журнал перечитывается при старте и когда инстанс становится лидером
+    def load(self):
+        guids = set()
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                guids = {line.rstrip("\n") for line in f if line.strip()}
+        except OSError:
+            pass
+        self._guids = guids
+
+    def __contains__(self, guid):
+        return guid in self._guids
+
+    def __len__(self):
+        return len(self._guids)
+
+    def add(self, guid: str):
+        if guid in self._guids:
+            return
+        self._guids.add(guid)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(guid.replace("\n", " ") + "\n")
+
+
+# 🧩 Инкрементальный разбор: элементы <item>/<entry> по мере прихода байтов
+def _items_from_events(parser, items, limit):
+    for _, elem in parser.read_events():
+        if elem.tag == "item":
+            title = elem.findtext("title")
+            guid = elem.findtext("guid") or elem.findtext("link") or title
+        elif elem.tag == ATOM_ENTRY:
+            title = elem.findtext("{http://www.w3.org/2005/Atom}title")
+            guid = elem.findtext("{http://www.w3.org/2005/Atom}id") or title
+        else:
+            continue
+        if title:
+            items.append({"guid": guid.strip(), "title": title.strip()})
+        elem.clear()
+        if len(items) >= limit:
+            return True
+    return False
+
+
+# 📰 Лента с условными запросами (ETag / If-Modified-Since) и дисковым кешем с TTL
+class RssFeed:
+    def __init__(self, url: str, name: str = None, ttl: int = RSS_CACHE_TTL, max_items: int = RSS_MAX_ITEMS):
+        self.url = url
+        self.ttl = ttl
+        self.max_items = max_items
+        self.cache_path = cache_path(f"{name or 'rss'}.json")
+        self._state = read_json(self.cache_path, {})
+
+    @property
+    def items(self) -> list:
+        return self._state.get("items", [])
+
+    async def fetch(self, timeout: float = None) -> list:
+        if time.time() - self._state.get("fetched_at", 0) < self.ttl:
+            log.info("📦 RSS из кеша: %s", self.url)
+            return self.items
+
+        headers = dict(RSS_HEADERS)
+        if self._state.get("etag"):
+            headers["If-None-Match"] = self._state["etag"]
+        if self._state.get("last_modified"):
+            headers["If-Modified-Since"] = self._state["last_modified"]
+
+        client = http_clients.get(self.url)
+        async with client.stream("GET", self.url, headers=headers, timeout=timeout) as r:
+            log.info("📥 Запрос RSS %s: %s", self.url, r.status_code)
+            if r.status_code == 304:
+                self._state["fetched_at"] = time.time()
+                await asyncio.to_thread(write_json, self.cache_path, self._state)
+                return self.items
+            if r.status_code != 200:
+                body = await r.aread()
+                logging.warning(f"⚠️ Ответ RSS: {r.status_code}, текст: {body[:300]}")
+                r.raise_for_status()
+
+            parser = ET.XMLPullParser(events=("end",))
+            items = []
+            async for chunk in r.aiter_bytes():
+                parser.feed(chunk)
+                # Набрали достаточно записей — остаток ленты не качаем
+                if _items_from_events(parser, items, self.max_items):
+                    break
+
+            self._state = {
+                "etag": r.headers.get("ETag"),
+                "last_modified": r.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+                "items": items,
+            }
+        await asyncio.to_thread(write_json, self.cache_path, self._state)
+        log.info("📚 Получено RSS-записей: %d", len(items))
+        return items
@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+# 🚦 Лимиты планировщика генераций
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("MAX_CONCURRENT_GENERATIONS", "4"))
+MAX_USER_QUEUE = int(os.getenv("MAX_USER_QUEUE", "3"))
+MAX_TOTAL_QUEUE = int(os.getenv("MAX_TOTAL_QUEUE", "100"))
+
+
+class SchedulerBusy(Exception):
+    pass
+
+
+# 🚦 Планировщик: общий лимит параллельных генераций, последовательные очереди на пользователя
+# и честный round-robin между пользователями
+class RequestScheduler:
+    def __init__(self, max_concurrency=MAX_CONCURRENT_GENERATIONS,
+                 max_user_queue=MAX_USER_QUEUE, max_total_queue=MAX_TOTAL_QUEUE):
+        self.max_concurrency = max_concurrency
+        self.max_user_queue = max_user_queue
+        self.max_total_queue = max_total_queue
+        self._queues = {}        # user_id -> deque[(enqueued_at, job, future)]
+        self._ready = asyncio.Queue()  # пользователи, у которых есть работа и нет активной генерации
+        self._scheduled = set()  # пользователи в _ready или в работе — в кольце каждый не больше одного раза
+        self._active = set()
+        self._pending = 0
+        self._workers = []
+        self._waits = deque(maxlen=500)
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "shed": 0}
+
+    def start(self):
+        if self._workers:
+            return
+        self._workers = [asyncio.create_task(self._worker(i)) for i in range(self.max_concurrency)]
+        logging.info(f"🚦 Планировщик запущен: воркеров {self.max_concurrency}")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    # 📥 Поставить задачу пользователя в очередь; job — функция без аргументов, возвращающая корутину
+    def submit(self, user_id, job) -> asyncio.Future:
+        queue = self._queues.get(user_id, ())
+        if len(queue) >= self.max_user_queue or self._pending >= self.max_total_queue:
+            self._stats["shed"] += 1
+            logging.warning(f"🚦 Очередь переполнена, запрос пользователя {user_id} отклонён")
+            raise SchedulerBusy()
+
+        queue = self._queues.setdefault(user_id, deque())
+        future = asyncio.get_running_loop().create_future()
+        entry = (time.monotonic(), job, future)
+        queue.append(entry)
+        # Отменённый запрос сразу освобождает место в очереди, не дожидаясь воркера
+        future.add_done_callback(lambda f: self._discard(user_id, entry) if f.cancelled() else None)
+        self._pending += 1
+        self._stats["submitted"] += 1
+        if user_id not in self._scheduled:
+            self._scheduled.add(user_id)
+            self._ready.put_nowait(user_id)
+        return future
+
+    def _discard(self, user_id, entry):
+        queue = self._queues.get(user_id)
+        if queue and entry in queue:
+            queue.remove(entry)
+            self._pending -= 1
+            self._stats["cancelled"] += 1
+
+    async def _worker(self, n):
+        while True:
+            user_id = await self._ready.get()
+            queue = self._queues.get(user_id)
+            if not queue:
+                # Все запросы пользователя отменили, пока он ждал в кольце
+                self._queues.pop(user_id, None)
+                self._scheduled.discard(user_id)
+                continue
+            enqueued_at, job, future = queue.popleft()
+            self._pending -= 1
+            self._active.add(user_id)
+            try:
+                if future.cancelled():
+                    self._stats["cancelled"] += 1
+                    continue
+                self._waits.append(time.monotonic() - enqueued_at)
+                await self._run(job, future)
+            finally:
+                self._active.discard(user_id)
+                if queue:
+                    # Пользователь уходит в конец кольца — остальные не ждут его хвост
+                    self._ready.put_nowait(user_id)
+                else:
+                    self._queues.pop(user_id, None)
+                    self._scheduled.discard(user_id)
+
+    async def _run(self, job, future):
+        task = asyncio.create_task(job())
+        # Отмена future снаружи отменяет и саму генерацию
+        future.add_done_callback(lambda f: task.cancel() if f.cancelled() else None)
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            self._stats["cancelled"] += 1
+            future.cancel()
+            # Останавливают сам воркер — пробрасываем отмену дальше
+            if asyncio.current_task().cancelling():
+                raise
+        except Exception as e:
+            self._stats["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+        else:
+            self._stats["completed"] += 1
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        waits = sorted(self._waits)
+        return {
+            **self._stats,
+            "queued": self._pending,
+            "active": len(self._active),
+            "users_waiting": len(self._queues),
+            "wait_avg": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "wait_p95": round(percentile(waits, 0.95), 3),
+            "wait_max": round(waits[-1], 3) if waits else 0.0,
+        }
+
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+scheduler = RequestScheduler()
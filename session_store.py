@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+
+# ⏱️ Сессия живёт 30 минут без сообщений
+SESSION_TTL = int(os.getenv("SESSION_TTL", "1800"))
+SESSIONS_DB = os.getenv("SESSIONS_DB", "sessions.sqlite3")
+SNAPSHOT_INTERVAL = int(os.getenv("SESSIONS_SNAPSHOT_INTERVAL", "60"))
+
+
+# 🗄️ Хранилище сессий: OrderedDict упорядочен по последнему касанию,
+# поэтому при очистке трогаем только просроченные записи с головы
+class SessionStore:
+    def __init__(self, factory, ttl: int = SESSION_TTL, path: str = SESSIONS_DB):
+        self.ttl = ttl
+        self.path = path
+        self._factory = factory  # () -> Conversation
+        self._sessions = OrderedDict()  # user_id -> [last_seen, Conversation]
+        self._saved = {}     # user_id -> версия, попавшая в последний снапшот
+        self._deleted = set()
+
+    def touch(self, user_id, now: float = None):
+        record = self._sessions.get(user_id)
+        if record is None:
+            record = self._sessions[user_id] = [0.0, self._factory()]
+        else:
+            self._sessions.move_to_end(user_id)
+        record[0] = time.time() if now is None else now
+        return record[1]
+
+    def get(self, user_id):
+        record = self._sessions.get(user_id)
+        return record[1] if record is not None else self.touch(user_id)
+
+    def last_seen(self, user_id):
+        record = self._sessions.get(user_id)
+        return record[0] if record is not None else None
+
+    def __contains__(self, user_id):
+        return user_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    # 🧹 Удаляем просроченные сессии: O(число просроченных)
+    def expire(self, now: float = None) -> list:
+        deadline = (time.time() if now is None else now) - self.ttl
+        expired = []
+        while self._sessions:
+            user_id, record = next(iter(self._sessions.items()))
+            if record[0] > deadline:
+                break
+            self._sessions.popitem(last=False)
+            self._saved.pop(user_id, None)
+            self._deleted.add(user_id)
+            expired.append(user_id)
+        return expired
+
+    # 💾 Снапшот: пишем только изменившиеся сессии, запись в SQLite — в отдельном потоке
+    async def snapshot(self):
+        rows = []
+        for user_id, (last_seen, conversation) in self._sessions.items():
+            if conversation.version and self._saved.get(user_id) != conversation.version:
+                rows.append((user_id, last_seen, json.dumps(conversation.to_dict(), ensure_ascii=False)))
+                self._saved[user_id] = conversation.version
+        deleted, self._deleted = list(self._deleted), set()
+        if rows or deleted:
+            await asyncio.to_thread(self._write, rows, deleted)
+            logging.info(f"💾 Снапшот сессий: сохранено {len(rows)}, удалено {len(deleted)}")
+
+    def _connect(self):
+        db = sqlite3.connect(self.path)
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, last_seen REAL NOT NULL, data TEXT NOT NULL)"
+        )
+        return db
+
+    def _write(self, rows, deleted):
+        db = self._connect()
+        try:
+            with db:
+                db.executemany("DELETE FROM sessions WHERE user_id = ?", [(u,) for u in deleted])
+                db.executemany("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)", rows)
+        finally:
+            db.close()
+
+    # 🧹 Удаляем просроченные сессии из общей базы (в том числе оставшиеся от упавших воркеров)
+    def purge(self, now: float = None) -> int:
+        deadline = (time.time() if now is None else now) - self.ttl
+        db = self._connect()
+        try:
+            with db:
+                return db.execute("DELETE FROM sessions WHERE last_seen <= ?", (deadline,)).rowcount
+        finally:
+            db.close()
+
+    # ♻️ Восстановление тёплых сессий после рестарта; owns отбирает пользователей своего шарда
+    def restore(self, now: float = None, owns=lambda user_id: True) -> int:
+        deadline = (time.time() if now is None else now) - self.ttl
+        try:
+            db = self._connect()
+        except sqlite3.Error as e:
+            logging.error(f"❌ Не удалось открыть {self.path}: {e}")
+            return 0
+        try:
+            with db:
+                db.execute("DELETE FROM sessions WHERE last_seen <= ?", (deadline,))
+            rows = db.execute("SELECT user_id, last_seen, data FROM sessions ORDER BY last_seen").fetchall()
+        finally:
+            db.close()
+
+        rows = [row for row in rows if owns(row[0])]
+        for user_id, last_seen, data in rows:
+            conversation = self._factory()
+            conversation.load(json.loads(data))
+            self._sessions[user_id] = [last_seen, conversation]
+            self._saved[user_id] = conversation.version
+        logging.info(f"♻️ Восстановлено сессий: {len(rows)}")
+        return len(rows)
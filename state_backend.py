@@ -0,0 +1,137 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+from paths import cache_path
+
+# 🗄️ Общее состояние инстансов: "memory" — один процесс, "sqlite[:путь]" — несколько
+# процессов на одной машине или общем диске (блокировки SQLite на уровне файла)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "sqlite")
+SQLITE_BUSY_TIMEOUT = float(os.getenv("STATE_BUSY_TIMEOUT", "10"))
+
+
+# 🗄️ Интерфейс хранилища: JSON-значения по ключу и аренды (lease) с владельцем и сроком.
+# Методы синхронные — из event loop SQLite вызываем через asyncio.to_thread
+class StateBackend:
+    def get(self, key: str, default=None):
+        raise NotImplementedError
+
+    def set(self, key: str, value):
+        raise NotImplementedError
+
+    # 🔑 Взять или продлить аренду: True, если она теперь наша до now + ttl
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def release(self, name: str, owner: str):
+        raise NotImplementedError
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self):
+        self._values = {}
+        self._leases = {}  # name -> (owner, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            value = self._values.get(key)
+        return default if value is None else json.loads(value)
+
+    def set(self, key: str, value):
+        encoded = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._values[key] = encoded
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is not None and holder[0] != owner and holder[1] > now:
+                return False
+            self._leases[name] = (owner, now + ttl)
+            return True
+
+    def release(self, name: str, owner: str):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+
+class SqliteBackend(StateBackend):
+    def __init__(self, path: str):
+        self.path = path
+        self._ready = False
+
+    # Файл и таблицы создаются при первом обращении, а не при импорте модуля
+    def _connect(self):
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT)
+        if not self._ready:
+            try:
+                with db:
+                    db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                    db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)")
+            except Exception:
+                db.close()
+                raise
+            self._ready = True
+        return db
+
+    def get(self, key: str, default=None):
+        db = self._connect()
+        try:
+            row = db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        finally:
+            db.close()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value):
+        db = self._connect()
+        try:
+            with db:
+                db.execute("INSERT OR REPLACE INTO state VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+        finally:
+            db.close()
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        db = self._connect()
+        try:
+            with db:
+                # Условный upsert атомарен: чужую живую аренду он не перезапишет
+                db.execute(
+                    "INSERT INTO leases VALUES (?, ?, ?) ON CONFLICT(name) DO UPDATE "
+                    "SET owner = excluded.owner, expires_at = excluded.expires_at "
+                    "WHERE leases.owner = excluded.owner OR leases.expires_at < ?",
+                    (name, owner, now + ttl, now),
+                )
+                row = db.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        finally:
+            db.close()
+        return row is not None and row[0] == owner
+
+    def release(self, name: str, owner: str):
+        db = self._connect()
+        try:
+            with db:
+                db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+        finally:
+            db.close()
+
+
+def make_backend(spec: str = STATE_BACKEND) -> StateBackend:
+    kind, _, path = spec.partition(":")
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "sqlite":
+        return SqliteBackend(path or cache_path("state.sqlite3"))
+    logging.warning(f"⚠️ Неизвестный STATE_BACKEND={spec!r}, используем память")
+    return MemoryBackend()
+
+
+state_backend = make_backend()
@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import logging
+
+from aiogram import types
+from aiogram.types import ParseMode
+from aiogram.utils.exceptions import MessageNotModified, TelegramAPIError
+
+from outbound import outbound
+from llm_router import LLMError
+from html_sanitizer import StreamSanitizer, sanitize, split_html
+
+# 🌊 Стриминг ответов: включается отдельно для личек и групп
+STREAM_PRIVATE = os.getenv("STREAM_PRIVATE", "1") == "1"
+STREAM_GROUP = os.getenv("STREAM_GROUP", "0") == "1"
+
+# ⏱️ Минимальный интервал между правками (в группах Telegram режет ~20 правок в минуту)
+EDIT_INTERVAL_PRIVATE = float(os.getenv("STREAM_EDIT_INTERVAL_PRIVATE", "1.0"))
+EDIT_INTERVAL_GROUP = float(os.getenv("STREAM_EDIT_INTERVAL_GROUP", "3.0"))
+
+PLACEHOLDER = "✍️ Печатаю..."
+
+log = logging.getLogger("ailex.stream")
+
+
+def streaming_enabled(chat_type: str) -> bool:
+    if chat_type == "private":
+        return STREAM_PRIVATE
+    return STREAM_GROUP
+
+
+def edit_interval(chat_type: str) -> float:
+    return EDIT_INTERVAL_PRIVATE if chat_type == "private" else EDIT_INTERVAL_GROUP
+
+
+# 📨 Ответ в HTML: очистка и разбиение на сообщения по 4096 символов
+async def reply_html(msg: types.Message, html: str):
+    parts = split_html(sanitize(html))
+    await outbound.send(msg.chat.id, lambda: msg.reply(parts[0], parse_mode=ParseMode.HTML))
+    await send_rest(msg.chat.id, msg.bot, parts[1:])
+
+
+async def send_rest(chat_id, bot, parts: list):
+    for part in parts:
+        await outbound.send(chat_id, lambda part=part: bot.send_message(chat_id, part, parse_mode=ParseMode.HTML))
+
+
+# 📝 Плейсхолдер + дросселированные правки по мере прихода токенов.
+# Токены очищаются инкрементально: каждая правка — снимок уже сбалансированного HTML
+async def stream_reply(msg: types.Message, chunks) -> str:
+    interval = edit_interval(msg.chat.type)
+    chat_id = msg.chat.id
+    placeholder = await outbound.send(chat_id, lambda: msg.reply(PLACEHOLDER))
+    edit_key = ("edit", chat_id, placeholder.message_id)
+    started = time.monotonic()
+    first_token_at = None
+    last_edit = 0.0
+    shown = PLACEHOLDER
+    text = ""
+    sanitizer = StreamSanitizer()
+    pending = set()
+
+    async def edit(new_text):
+        nonlocal shown
+        if not new_text.strip() or new_text == shown:
+            return
+        try:
+            # Невышедшая правка заменяется свежей — в очереди висит максимум одна
+            await outbound.send(chat_id, lambda: placeholder.edit_text(new_text, parse_mode=ParseMode.HTML), key=edit_key)
+            shown = new_text
+        except MessageNotModified:
+            pass
+        except TelegramAPIError as e:
+            logging.warning(f"⚠️ Не удалось обновить сообщение: {e}")
+
+    try:
+        async for delta in chunks:
+            text += delta
+            sanitizer.feed(delta)
+            now = time.monotonic()
+            if first_token_at is None:
+                first_token_at = now
+                log.info("⚡ Первый токен через %.2f сек", first_token_at - started)
+            if now - last_edit >= interval:
+                last_edit = now
+                # Правка уходит через очередь исходящих, а токены продолжаем читать
+                task = asyncio.create_task(edit(split_html(sanitizer.snapshot())[0]))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+    except BaseException:
+        # Генерацию отменили (пришло новое сообщение) или она упала — убираем недописанный ответ
+        for task in pending:
+            task.cancel()
+        try:
+            await outbound.send(chat_id, placeholder.delete)
+        except TelegramAPIError:
+            pass
+        raise
+
+    await asyncio.gather(*pending)
+    final = sanitizer.finish()
+    if not final.strip():
+        # Поток закончился без текста — убираем плейсхолдер, ответ об ошибке пошлёт вызывающий
+        try:
+            await outbound.send(chat_id, placeholder.delete)
+        except TelegramAPIError:
+            pass
+        raise LLMError("пустой ответ модели")
+    # Плейсхолдер получает первую часть, хвост длиннее 4096 уходит отдельными сообщениями
+    parts = split_html(final)
+    await edit(parts[0])
+    await send_rest(chat_id, msg.bot, parts[1:])
+    log.info("🌊 Стриминг завершён за %.2f сек, символов: %d", time.monotonic() - started, len(text))
+    return text
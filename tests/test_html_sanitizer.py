@@ -0,0 +1,43 @@
+from html_sanitizer import StreamSanitizer, sanitize, split_html
+
+LONG_LINK = '<a href="https://example.com/article?' + "utm_source=telegram&amp;" * 30 + 'id=1">статья</a>'
+
+
+def stream(html: str, size: int) -> str:
+    sanitizer = StreamSanitizer()
+    for i in range(0, len(html), size):
+        sanitizer.feed(html[i:i + size])
+    return sanitizer.finish()
+
+
+def test_long_tag_survives_streaming():
+    html = f"Читайте {LONG_LINK} до конца."
+    assert len(LONG_LINK) > 256
+    for size in (1, 7, 64):
+        assert stream(html, size) == sanitize(html)
+    assert sanitize(html).count("<a href=") == 1
+
+
+def test_plain_less_than_is_escaped_in_stream():
+    assert stream("если a <b то c", 3) == sanitize("если a <b то c") == "если a &lt;b то c"
+
+
+def test_named_entities_are_decoded():
+    assert sanitize("a&nbsp;b &mdash; &amp; &lt;") == "a\xa0b — &amp; &lt;"
+
+
+def test_split_respects_limit_with_deep_nesting():
+    html = sanitize("<b><i><u><s><code>" + "слово " * 200 + "</code></s></u></i></b>")
+    for limit in (20, 32, 48, 100):
+        chunks = split_html(html, limit)
+        assert all(len(chunk) <= limit for chunk in chunks)
+        assert all(sanitize(chunk) == chunk for chunk in chunks)
+        assert "".join(chunks).count("слово") == 200
+
+
+def test_split_reopens_tags_in_next_chunk():
+    html = "<b>" + "жирный текст " * 500 + "</b>"
+    chunks = split_html(html)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 4096 for chunk in chunks)
+    assert all(chunk.startswith("<b>") and chunk.endswith("</b>") for chunk in chunks)
@@ -0,0 +1,59 @@
+import asyncio
+
+from quality import MinHashIndex, QualityEngine, minhash
+from state_backend import MemoryBackend
+
+POST = (
+    "<b>Нейросети в малом бизнесе</b>\n"
+    "• Чат-бот поддержки отвечает клиентам ночью и в выходные, пока менеджеры отдыхают.\n"
+    "• Модель разбирает входящие счета, сверяет суммы с договорами и подсвечивает расхождения.\n"
+    "• Генератор описаний товаров экономит копирайтеру пару часов каждый день.\n"
+    "Начните с одной рутинной задачи, измерьте результат за месяц и только потом масштабируйте. "
+    "А какие процессы вы уже отдали искусственному интеллекту?"
+)
+OTHER = (
+    "<b>Как выбрать языковую модель для проекта</b>\n"
+    "Сравните стоимость токена, длину контекста и качество ответов на ваших собственных примерах. "
+    "Открытые модели можно запустить локально и не отправлять данные наружу, закрытые обычно "
+    "сильнее в рассуждениях. Держите под рукой запасной вариант на случай сбоев провайдера "
+    "и следите за задержкой: пользователи не любят ждать ответа дольше пары секунд."
+)
+
+
+def engine_with(*texts) -> QualityEngine:
+    engine = QualityEngine(state=MemoryBackend())
+    for text in texts:
+        asyncio.run(engine.remember(text))
+    return engine
+
+
+def test_one_word_edit_is_duplicate():
+    engine = engine_with(POST)
+    assert engine.is_duplicate(POST.replace("ночью", "круглосуточно"))
+
+
+def test_two_word_edit_is_duplicate():
+    engine = engine_with(POST)
+    edited = POST.replace("пару часов", "несколько часов").replace("месяц", "квартал")
+    assert engine.is_duplicate(edited)
+
+
+def test_different_post_is_not_duplicate():
+    engine = engine_with(POST)
+    assert not engine.is_duplicate(OTHER)
+
+
+def test_index_survives_reload():
+    state = MemoryBackend()
+    asyncio.run(QualityEngine(state=state).remember(POST, "Нейросети в бизнесе"))
+    engine = QualityEngine(state=state)
+    assert engine.is_duplicate(POST)
+    assert not engine.topic_allowed("Нейросети в бизнесе")
+
+
+def test_index_evicts_oldest():
+    index = MinHashIndex(size=1)
+    index.add(minhash(POST))
+    index.add(minhash(OTHER))
+    assert index.nearest(minhash(POST)) is None
+    assert index.nearest(minhash(OTHER)) is not None
@@ -0,0 +1,172 @@
+import os
+import re
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+from http_client import http_clients
+from rss_feed import RssFeed, PostedIndex
+from state_backend import StateBackend, state_backend
+from metrics import timed, error
+
+# 📡 Ленты для автопостинга: "имя=url" через запятую
+RSS_FEEDS = os.getenv("RSS_FEEDS", "vc_ru=https://vc.ru/rss")
+RSS_CONCURRENCY = int(os.getenv("RSS_CONCURRENCY", "4"))
+RSS_FEED_TIMEOUT = float(os.getenv("RSS_FEED_TIMEOUT", "10"))
+RSS_BACKOFF_BASE = float(os.getenv("RSS_BACKOFF_BASE", "60"))
+RSS_BACKOFF_MAX = float(os.getenv("RSS_BACKOFF_MAX", "3600"))
+TOPIC_QUEUE_LOW = int(os.getenv("TOPIC_QUEUE_LOW", "3"))
+TOPIC_SEEN_LIMIT = 2000
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def parse_feeds(spec: str) -> list:
+    feeds = []
+    for i, part in enumerate(p.strip() for p in spec.split(",")):
+        if not part:
+            continue
+        if "=" in part.split("://")[0]:
+            name, _, url = part.partition("=")
+        else:
+            name, url = f"feed{i}", part
+        feeds.append(RssFeed(url, name=name))
+    return feeds
+
+
+# 🔑 Ключ дедупликации между лентами: регистр и пунктуация не важны
+def title_key(title: str) -> str:
+    return _NON_WORD.sub(" ", title.casefold()).strip()
+
+
+# 📡 Параллельный сбор лент с таймаутом и экспоненциальным backoff для падающих
+class FeedAggregator:
+    def __init__(self, feeds: list, concurrency: int = RSS_CONCURRENCY, timeout: float = RSS_FEED_TIMEOUT):
+        self.feeds = feeds
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._failures = {feed.url: 0 for feed in feeds}
+        self._retry_at = {feed.url: 0.0 for feed in feeds}
+
+    async def _fetch(self, feed: RssFeed) -> list:
+        if time.time() < self._retry_at[feed.url]:
+            return []
+        async with self._semaphore:
+            try:
+                with timed("feed_fetch"):
+                    items = await asyncio.wait_for(feed.fetch(timeout=self.timeout), self.timeout)
+            except Exception as e:
+                http_clients.record_error(feed.url)
+                error("rss")
+                self._failures[feed.url] += 1
+                delay = min(RSS_BACKOFF_BASE * 2 ** (self._failures[feed.url] - 1), RSS_BACKOFF_MAX)
+                delay *= random.uniform(0.8, 1.2)
+                self._retry_at[feed.url] = time.time() + delay
+                logging.warning(f"⚠️ Лента {feed.url} недоступна ({e!r}), повтор через {delay:.0f} сек")
+                return []
+        self._failures[feed.url] = 0
+        return items
+
+    # 📊 Записи всех лент с рейтингом: свежесть в ленте × вес ленты, плюс бонус за повторы в других лентах
+    async def collect(self) -> list:
+        results = await asyncio.gather(*(self._fetch(feed) for feed in self.feeds))
+        ranked = {}
+        for feed_pos, (feed, items) in enumerate(zip(self.feeds, results)):
+            weight = 1.0 / (1 + 0.25 * feed_pos)
+            for pos, item in enumerate(items):
+                key = title_key(item["title"])
+                score = weight / (1 + pos)
+                if key in ranked:
+                    ranked[key]["score"] += score
+                else:
+                    ranked[key] = {"title": item["title"], "guid": item["guid"], "source": feed.url, "score": score}
+        return sorted(ranked.values(), key=lambda entry: entry["score"], reverse=True)
+
+    def stats(self) -> dict:
+        return {feed.url: {"failures": self._failures[feed.url], "retry_at": self._retry_at[feed.url]} for feed in self.feeds}
+
+
+# 🗃️ Очередь тем: чередует статичные темы и ранжированные записи лент;
+# состояние в общем хранилище — переживает рестарт и смену лидера
+class TopicQueue:
+    def __init__(self, topics: list, aggregator: FeedAggregator, posted: PostedIndex,
+                 state: StateBackend = state_backend, key: str = "topic_queue"):
+        self.topics = topics
+        self.aggregator = aggregator
+        self.posted = posted
+        self.state = state
+        self.key = key
+        self.load()
+
+    # ♻️ Состояние из хранилища: при старте и когда инстанс становится лидером
+    def load(self):
+        state = self.state.get(self.key, {})
+        self._rss = deque(state.get("rss", []))
+        self._seen = deque(state.get("seen", []), maxlen=TOPIC_SEEN_LIMIT)
+        self._seen_set = set(self._seen)
+        self._topic_pos = state.get("topic_pos", 0)
+        self._use_topic = state.get("use_topic", True)
+
+    def __len__(self):
+        return len(self._rss)
+
+    async def refill(self):
+        added = 0
+        for entry in await self.aggregator.collect():
+            key = title_key(entry["title"])
+            if key in self._seen_set or entry["guid"] in self.posted:
+                continue
+            self._rss.append(entry)
+            self._remember(key)
+            added += 1
+        if added:
+            # Пересортировка только при пополнении — выдача остаётся O(1)
+            self._rss = deque(sorted(self._rss, key=lambda e: e["score"], reverse=True))
+        logging.info(f"🗃️ Очередь тем пополнена: +{added}, всего {len(self._rss)}")
+        await self._save()
+
+    def _remember(self, key: str):
+        if len(self._seen) == self._seen.maxlen:
+            self._seen_set.discard(self._seen[0])
+        self._seen.append(key)
+        self._seen_set.add(key)
+
+    # ↩️ Тема не дала поста (сбой генерации или фильтр) — запись ленты снова может
+    # попасть в очередь при следующем пополнении, если она ещё есть в ленте
+    async def release(self, title: str):
+        key = title_key(title)
+        if key in self._seen_set:
+            self._seen.remove(key)
+            self._seen_set.discard(key)
+            await self._save()
+
+    # ▶️ Следующая тема: (title, source, guid) — source "topics" либо url ленты
+    async def next(self):
+        use_topic, self._use_topic = self._use_topic, not self._use_topic
+        if not use_topic:
+            if len(self._rss) < TOPIC_QUEUE_LOW:
+                await self.refill()
+            if self._rss:
+                entry = self._rss.popleft()
+                await self._save()
+                return entry["title"], entry["source"], entry["guid"]
+            logging.warning("❌ Нет тем из RSS — берём тему из списка")
+
+        topic = self.topics[self._topic_pos % len(self.topics)]
+        self._topic_pos += 1
+        await self._save()
+        return topic, "topics", None
+
+    async def _save(self):
+        state = {
+            "rss": list(self._rss),
+            "seen": list(self._seen),
+            "topic_pos": self._topic_pos,
+            "use_topic": self._use_topic,
+        }
+        await asyncio.to_thread(self.state.set, self.key, state)
+
+    def stats(self) -> dict:
+        return {"rss_queued": len(self._rss), "seen": len(self._seen), "topic_pos": self._topic_pos}
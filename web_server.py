@@ -0,0 +1,59 @@
+import os
+import hmac
+import hashlib
+import logging
+
+from aiohttp import web
+from aiogram.dispatcher.webhook import WebhookRequestHandler, BOT_DISPATCHER_KEY
+
+from metrics import metrics_handler, trace_handler
+
+# 🌐 Параметры HTTP-сервера и вебхука
+PORT = int(os.getenv("PORT", "8080"))
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST") or os.getenv("RENDER_EXTERNAL_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Telegram принимает secret_token только из [A-Za-z0-9_-]{1,256}, а сгенерированный Render
+# секрет — base64 (+ / =). Поэтому в setWebhook уходит hex-отпечаток секрета
+WEBHOOK_TOKEN = hashlib.sha256(WEBHOOK_SECRET.encode("utf-8")).hexdigest() if WEBHOOK_SECRET else ""
+# webhook — прод (Render), polling — локальная разработка
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if WEBHOOK_HOST else "polling")
+
+
+def webhook_url() -> str:
+    return WEBHOOK_HOST.rstrip("/") + WEBHOOK_PATH
+
+
+# 🔐 Вебхук принимает только запросы с секретом, который мы передали в setWebhook
+class SecretWebhookHandler(WebhookRequestHandler):
+    def validate_ip(self):
+        super().validate_ip()
+        if WEBHOOK_TOKEN:
+            token = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, WEBHOOK_TOKEN):
+                logging.warning("🚫 Вебхук: неверный секретный токен")
+                raise web.HTTPUnauthorized()
+
+
+async def index(request):
+    return web.Response(text="Bot is alive!")
+
+
+# 🌐 Один aiohttp-сервер на event loop: health-check, метрики и (в режиме webhook) приём апдейтов
+def create_app(dp, with_webhook: bool) -> web.Application:
+    app = web.Application()
+    app.router.add_get("/", index)
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_route("*", "/trace", trace_handler)
+    if with_webhook:
+        app.router.add_route("*", WEBHOOK_PATH, SecretWebhookHandler, name="webhook_handler")
+        app[BOT_DISPATCHER_KEY] = dp
+    return app
+
+
+async def start_server(app: web.Application, host: str = "0.0.0.0", port: int = PORT) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"🚀 HTTP-сервер запущен на {host}:{port}")
+    return runner